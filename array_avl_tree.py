@@ -0,0 +1,412 @@
+from itertools import islice, takewhile
+
+import numpy as np
+
+from avl_tree import prefers_rebuild
+
+NIL = 0  # Handle 0 is a sentinel with height and size 0, so it needs no checks
+
+
+class ArrayAVLTree:
+    # An AVLTree whose nodes are integer handles into preallocated NumPy arrays
+    # (struct of arrays) instead of separate Python objects.
+    def __init__(self, capacity: int = 1024, order_statistics: bool = False, key_dtype=np.int64):
+        capacity = max(capacity, 2)
+        self.order_statistics = order_statistics
+        self.keys = np.zeros(capacity, dtype=key_dtype)
+        self.heights = np.zeros(capacity, dtype=np.int8)
+        self.left = np.zeros(capacity, dtype=np.int32)
+        self.right = np.zeros(capacity, dtype=np.int32)
+        self.sizes = np.zeros(capacity, dtype=np.int32) if order_statistics else None
+        self.root = NIL
+        self.used = 1  # Slots below this have been handed out at least once
+        self.free = NIL  # Head of the free list, chained through `left`
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    @classmethod
+    def from_sorted(cls, keys, order_statistics: bool = False, key_dtype=np.int64):
+        keys = np.sort(np.asarray(keys, dtype=key_dtype).ravel())
+        tree = cls(len(keys) + 1, order_statistics=order_statistics, key_dtype=key_dtype)
+        tree._load_sorted(keys)
+        return tree
+
+    def _load_sorted(self, keys: np.ndarray):
+        # Lays the perfectly balanced tree out level by level: the key at sorted
+        # position p lives in slot p + 1 and every range [lo, hi) is rooted at
+        # its middle, exactly like AVLTree._build_balanced but vectorised.
+        n = len(keys)
+        if len(self.keys) < n + 1:
+            self._resize(n + 1)
+        self.keys[1:n + 1] = keys
+        self.left[:n + 1] = NIL
+        self.right[:n + 1] = NIL
+        lo = np.array([0] if n else [], dtype=np.int64)
+        hi = np.array([n] if n else [], dtype=np.int64)
+        self.root = (n // 2 + 1) if n else NIL
+        while len(lo):
+            mid = (lo + hi) // 2
+            slots = mid + 1
+            width = hi - lo
+            self.heights[slots] = np.frexp(width)[1]
+            if self.sizes is not None:
+                self.sizes[slots] = width
+            has_left = lo < mid
+            has_right = mid + 1 < hi
+            self.left[slots[has_left]] = (lo[has_left] + mid[has_left]) // 2 + 1
+            self.right[slots[has_right]] = (mid[has_right] + 1 + hi[has_right]) // 2 + 1
+            lo, hi = (np.concatenate([lo[has_left], mid[has_right] + 1]),
+                      np.concatenate([mid[has_left], hi[has_right]]))
+        self.used = n + 1
+        self.free = NIL
+        self.length = n
+
+    def to_buffers(self) -> dict:
+        buffers = {
+            "keys": self.keys[:self.used].copy(),
+            "heights": self.heights[:self.used].copy(),
+            "left": self.left[:self.used].copy(),
+            "right": self.right[:self.used].copy(),
+            "meta": np.array([self.root, self.free, self.length], dtype=np.int64),
+        }
+        if self.sizes is not None:
+            buffers["sizes"] = self.sizes[:self.used].copy()
+        return buffers
+
+    @classmethod
+    def from_buffers(cls, buffers) -> "ArrayAVLTree":
+        keys = buffers["keys"]
+        tree = cls(len(keys), order_statistics="sizes" in buffers, key_dtype=keys.dtype)
+        tree.keys[:len(keys)] = keys
+        tree.heights[:len(keys)] = buffers["heights"]
+        tree.left[:len(keys)] = buffers["left"]
+        tree.right[:len(keys)] = buffers["right"]
+        if tree.sizes is not None:
+            tree.sizes[:len(keys)] = buffers["sizes"]
+        tree.root, tree.free, tree.length = (int(v) for v in buffers["meta"])
+        tree.used = len(keys)
+        return tree
+
+    def save(self, path: str):
+        np.savez(path, **self.to_buffers())
+
+    @classmethod
+    def load(cls, path: str) -> "ArrayAVLTree":
+        with np.load(path) as buffers:
+            return cls.from_buffers(buffers)
+
+    def _resize(self, capacity: int):
+        def grow(array):
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[:len(array)] = array
+            return grown
+
+        self.keys = grow(self.keys)
+        self.heights = grow(self.heights)
+        self.left = grow(self.left)
+        self.right = grow(self.right)
+        if self.sizes is not None:
+            self.sizes = grow(self.sizes)
+
+    def _allocate(self, key: int) -> int:
+        if self.free != NIL:
+            node = self.free
+            self.free = int(self.left[node])
+        else:
+            if self.used == len(self.keys):
+                self._resize(2 * len(self.keys))
+            node = self.used
+            self.used += 1
+        self.keys[node] = key
+        self.heights[node] = 1
+        self.left[node] = NIL
+        self.right[node] = NIL
+        if self.sizes is not None:
+            self.sizes[node] = 1
+        self.length += 1
+        return node
+
+    def _release(self, node: int):
+        self.left[node] = self.free
+        self.free = node
+        self.length -= 1
+
+    def get_height(self, node: int) -> int:
+        return int(self.heights[node])
+
+    def get_balance(self, node: int) -> int:
+        return int(self.heights[self.left[node]]) - int(self.heights[self.right[node]])
+
+    def update(self, node: int):
+        left = self.left[node]
+        right = self.right[node]
+        self.heights[node] = 1 + max(self.heights[left], self.heights[right])
+        if self.sizes is not None:
+            self.sizes[node] = 1 + self.sizes[left] + self.sizes[right]
+
+    def get_min_value_node(self, node: int) -> int:
+        current = node
+        while current != NIL and self.left[current] != NIL:
+            current = self.left[current]
+        return int(current)
+
+    def right_rotate(self, z: int) -> int:
+        y = self.left[z]
+        self.left[z] = self.right[y]
+        self.right[y] = z
+        self.update(z)
+        self.update(y)
+        return y
+
+    def left_rotate(self, z: int) -> int:
+        y = self.right[z]
+        self.right[z] = self.left[y]
+        self.left[y] = z
+        self.update(z)
+        self.update(y)
+        return y
+
+    def rebalance(self, node: int) -> int:
+        self.update(node)
+        balance = self.get_balance(node)
+        if balance > 1:
+            if self.get_balance(self.left[node]) < 0:
+                self.left[node] = self.left_rotate(self.left[node])
+            return self.right_rotate(node)
+        if balance < -1:
+            if self.get_balance(self.right[node]) > 0:
+                self.right[node] = self.right_rotate(self.right[node])
+            return self.left_rotate(node)
+        return node
+
+    def _retrace(self, path: list) -> int:
+        for i in range(len(path) - 1, -1, -1):
+            node = path[i]
+            old_height = self.heights[node]
+            subtree = self.rebalance(node)
+            if i == 0:
+                return subtree
+            parent = path[i - 1]
+            if subtree != node:
+                if self.left[parent] == node:
+                    self.left[parent] = subtree
+                else:
+                    self.right[parent] = subtree
+            if self.heights[subtree] == old_height:
+                if self.sizes is not None:
+                    for ancestor in reversed(path[:i]):
+                        self.update(ancestor)
+                return path[0]
+
+    def insert(self, node: int, key: int) -> int:
+        if node == NIL:
+            return self._allocate(key)
+        keys, left, right = self.keys, self.left, self.right
+        path = []
+        current = node
+        while current:
+            path.append(current)
+            current = left[current] if key < keys[current] else right[current]
+        parent = path[-1]
+        if key < self.keys[parent]:
+            self.left[parent] = self._allocate(key)
+        else:
+            self.right[parent] = self._allocate(key)
+        return self._retrace(path)
+
+    def insert_key(self, key: int, value=None):
+        if value is not None:
+            raise TypeError("ArrayAVLTree holds keys only")
+        self.root = self.insert(self.root, key)
+
+    def delete(self, node: int, key: int) -> int:
+        path = []
+        current = node
+        while current != NIL and self.keys[current] != key:
+            path.append(current)
+            current = self.left[current] if key < self.keys[current] else self.right[current]
+        if current == NIL:
+            return node
+        if self.left[current] != NIL and self.right[current] != NIL:
+            path.append(current)
+            successor = self.right[current]
+            while self.left[successor] != NIL:
+                path.append(successor)
+                successor = self.left[successor]
+            self.keys[current] = self.keys[successor]
+            current = successor
+        replacement = self.left[current] if self.left[current] != NIL else self.right[current]
+        self._release(current)
+        if not path:
+            return replacement
+        parent = path[-1]
+        if self.left[parent] == current:
+            self.left[parent] = replacement
+        else:
+            self.right[parent] = replacement
+        return self._retrace(path)
+
+    def delete_key(self, key: int):
+        self.root = self.delete(self.root, key)
+
+    def search(self, node: int, key: int) -> bool:
+        keys, left, right = self.keys, self.left, self.right
+        current = node
+        while current:
+            current_key = keys[current]
+            if current_key == key:
+                return True
+            current = left[current] if key < current_key else right[current]
+        return False
+
+    def search_key(self, key: int) -> bool:
+        return self.search(self.root, key)
+
+    def search_key_with_path(self, key: int):
+        path = []
+        current = self.root
+        while current != NIL:
+            path.append(int(current))
+            if self.keys[current] == key:
+                return True, path
+            current = self.left[current] if key < self.keys[current] else self.right[current]
+        return False, path
+
+    def search_many(self, keys) -> np.ndarray:
+        # All probes descend together, one vectorised step per tree level.
+        probes = np.asarray(keys).ravel()
+        found = np.zeros(len(probes), dtype=bool)
+        current = np.full(len(probes), self.root, dtype=np.int32)
+        active = np.flatnonzero(current != NIL)
+        while len(active):
+            nodes = current[active]
+            node_keys = self.keys[nodes]
+            wanted = probes[active]
+            hit = node_keys == wanted
+            found[active[hit]] = True
+            nodes = np.where(wanted < node_keys, self.left[nodes], self.right[nodes])
+            current[active] = nodes
+            active = active[~hit & (nodes != NIL)]
+        return found
+
+    def _live_keys(self) -> np.ndarray:
+        live = np.ones(self.used, dtype=bool)
+        live[NIL] = False
+        node = self.free
+        while node != NIL:
+            live[node] = False
+            node = self.left[node]
+        return np.sort(self.keys[:self.used][live])
+
+    def merge(self, other: "ArrayAVLTree"):
+        self._load_sorted(np.sort(np.concatenate([self._live_keys(), other._live_keys()])))
+
+    def insert_many(self, keys) -> int:
+        batch = np.asarray(keys, dtype=self.keys.dtype).ravel()
+        if self._prefers_rebuild(len(batch)):
+            self._load_sorted(np.sort(np.concatenate([self._live_keys(), batch])))
+        else:
+            for key in np.sort(batch).tolist():
+                self.insert_key(key)
+        return len(batch)
+
+    def delete_many(self, keys) -> int:
+        batch = np.sort(np.asarray(keys, dtype=self.keys.dtype).ravel())
+        if not len(batch):
+            return 0
+        if self._prefers_rebuild(len(batch)):
+            existing = self._live_keys()
+            unique, counts = np.unique(batch, return_counts=True)
+            pos = np.minimum(unique.searchsorted(existing), len(unique) - 1)
+            requested = np.where(unique[pos] == existing, counts[pos], 0)
+            rank = np.arange(len(existing)) - existing.searchsorted(existing, side="left")
+            kept = existing[rank >= requested]
+            self._load_sorted(kept)
+            return len(existing) - len(kept)
+        removed = 0
+        for key in batch.tolist():
+            before = self.length
+            self.delete_key(key)
+            removed += before - self.length
+        return removed
+
+    def _prefers_rebuild(self, batch_size: int) -> bool:
+        return prefers_rebuild(batch_size, self.get_height(self.root), self.length)
+
+    def iter_range(self, lo: int = None, hi: int = None, reverse: bool = False):
+        near, far = (self.right, self.left) if reverse else (self.left, self.right)
+        if reverse:
+            lo, hi = hi, lo
+        stack = []
+        current = self.root
+        while True:
+            while current != NIL:
+                key = self.keys[current]
+                if lo is not None and (key > lo if reverse else key < lo):
+                    current = far[current]
+                else:
+                    stack.append(current)
+                    current = near[current]
+            if not stack:
+                return
+            node = stack.pop()
+            key = self.keys[node]
+            if hi is not None and (key < hi if reverse else key > hi):
+                return
+            yield key.item()
+            current = far[node]
+
+    def __iter__(self):
+        return self.iter_range()
+
+    def __reversed__(self):
+        return self.iter_range(reverse=True)
+
+    def count_range(self, lo: int = None, hi: int = None) -> int:
+        if self.sizes is None:
+            return sum(1 for _ in self.iter_range(lo, hi))
+        upper = self.length if hi is None else self._rank(hi, inclusive=True)
+        lower = 0 if lo is None else self._rank(lo, inclusive=False)
+        return max(upper - lower, 0)
+
+    def rank(self, key: int) -> int:
+        if self.sizes is None:
+            return sum(1 for _ in takewhile(lambda k: k < key, self.iter_range()))
+        return self._rank(key, inclusive=False)
+
+    def select(self, i: int) -> int:
+        if not 0 <= i < self.length:
+            raise IndexError("select index out of range")
+        if self.sizes is None:
+            return next(islice(self.iter_range(), i, None))
+        current = self.root
+        while True:
+            left_size = int(self.sizes[self.left[current]])
+            if i < left_size:
+                current = self.left[current]
+            elif i == left_size:
+                return self.keys[current].item()
+            else:
+                i -= left_size + 1
+                current = self.right[current]
+
+    def quantile(self, q: float) -> int:
+        if not 0 <= q <= 1:
+            raise ValueError("quantile must be between 0 and 1")
+        if not self.length:
+            raise IndexError("quantile of an empty tree")
+        return self.select(int(q * (self.length - 1)))
+
+    def _rank(self, key: int, inclusive: bool) -> int:
+        rank = 0
+        current = self.root
+        while current != NIL:
+            current_key = self.keys[current]
+            if current_key < key or (inclusive and current_key == key):
+                rank += 1 + int(self.sizes[self.left[current]])
+                current = self.right[current]
+            else:
+                current = self.left[current]
+        return rank
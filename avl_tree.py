@@ -1,22 +1,152 @@
+import bisect
+import gc
+import heapq
+from itertools import islice, takewhile
+from operator import itemgetter
+
+import numpy as np
+
+
+def prefers_rebuild(batch_size: int, height: int, size: int) -> bool:
+    # Merging the batch and rebuilding costs O(n + m) but allocates every node
+    # again, which measures at about four per-key descents' worth of work per
+    # key. Shared by AVLTree and ArrayAVLTree.
+    return batch_size * max(height, 1) >= 4 * size
+
+
 class AVLNode:
-    __slots__ = ['key', 'height', 'left', 'right']
+    __slots__ = ['key', 'value', 'height', 'size', 'left', 'right']
 
-    def __init__(self, key: int):
+    def __init__(self, key: int, value=None):
         self.key = key
+        self.value = value  # Payload when the tree is used as a map
         self.height = 1  # Initial height for a new leaf node
+        self.size = 1  # Keys in this subtree, kept up to date with order statistics
         self.left = None
         self.right = None
 
 
 class AVLTree:
-    def __init__(self):
+    node_class = AVLNode
+
+    def __init__(self, order_statistics: bool = False):
         self.root = None
+        self.order_statistics = order_statistics
+
+    @classmethod
+    def from_sorted(cls, keys, order_statistics: bool = False, values=None):
+        tree = cls(order_statistics=order_statistics)
+        if values is None:
+            tree.root = tree._build_balanced(sorted(keys))
+        else:
+            items = sorted(zip(keys, values), key=itemgetter(0))
+            tree.root = tree._build_balanced([key for key, _ in items], [value for _, value in items])
+        return tree
+
+    def merge(self, other: "AVLTree"):
+        merged = list(heapq.merge(self._inorder_items(self.root), other._inorder_items(other.root),
+                                  key=itemgetter(0)))
+        self.root = self._build_balanced([key for key, _ in merged], [value for _, value in merged])
+
+    def insert_many(self, keys) -> int:
+        batch = sorted(np.asarray(keys).ravel().tolist())
+        if self._prefers_rebuild(len(batch)):
+            merged = list(heapq.merge(self._inorder_items(self.root), ((key, None) for key in batch),
+                                      key=itemgetter(0)))
+            self.root = self._build_balanced([key for key, _ in merged], [value for _, value in merged])
+        else:
+            for key in batch:
+                self.insert_key(key)
+        return len(batch)
+
+    def delete_many(self, keys) -> int:
+        batch = sorted(np.asarray(keys).ravel().tolist())
+        if not batch:
+            return 0
+        if self._prefers_rebuild(len(batch)):
+            kept = []
+            kept_values = []
+            removed = 0
+            j = 0
+            for key, value in self._inorder_items(self.root):
+                while j < len(batch) and batch[j] < key:
+                    j += 1
+                if j < len(batch) and batch[j] == key:
+                    j += 1
+                    removed += 1
+                else:
+                    kept.append(key)
+                    kept_values.append(value)
+            self.root = self._build_balanced(kept, kept_values)
+            return removed
+        removed = 0
+        for key in batch:
+            if self.search_key(key):
+                self.delete_key(key)
+                removed += 1
+        return removed
+
+    def _prefers_rebuild(self, batch_size: int) -> bool:
+        # Without order statistics no node counts its subtree, so the size is
+        # estimated from the height: a tree of height h holds about 2 ** (h - 1)
+        # keys.
+        height = self.get_height(self.root)
+        if self.order_statistics and self.root:
+            size = self.root.size
+        else:
+            size = 1 << max(height - 1, 0)
+        return prefers_rebuild(batch_size, height, size)
+
+    def _build_balanced(self, keys: list, values: list = None) -> AVLNode:
+        # Every subtree takes the middle key as its root, so sibling heights
+        # differ by at most one and a range of s keys has height s.bit_length().
+        def build(lo: int, hi: int) -> AVLNode:
+            if lo >= hi:
+                return None
+            mid = (lo + hi) // 2
+            node = self.node_class(keys[mid], None if values is None else values[mid])
+            node.height = (hi - lo).bit_length()
+            node.size = hi - lo
+            node.left = build(lo, mid)
+            node.right = build(mid + 1, hi)
+            return node
+
+        # Allocating one node per key would otherwise trigger repeated full
+        # collections that cost more than the build itself.
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return build(0, len(keys))
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def _inorder_items(self, node: AVLNode):
+        stack = []
+        current = node
+        while stack or current:
+            while current:
+                stack.append(current)
+                current = current.left
+            current = stack.pop()
+            yield current.key, current.value
+            current = current.right
 
     def get_height(self, node: AVLNode) -> int:
         if not node:
             return 0
         return node.height
 
+    def get_size(self, node: AVLNode) -> int:
+        if not node:
+            return 0
+        return node.size
+
+    def update(self, node: AVLNode):
+        node.height = 1 + max(self.get_height(node.left), self.get_height(node.right))
+        if self.order_statistics:
+            node.size = 1 + self.get_size(node.left) + self.get_size(node.right)
+
     def get_balance(self, node: AVLNode) -> int:
         if not node:
             return 0
@@ -33,8 +163,8 @@ class AVLTree:
         T3 = y.right
         y.right = z
         z.left = T3
-        z.height = 1 + max(self.get_height(z.left), self.get_height(z.right))
-        y.height = 1 + max(self.get_height(y.left), self.get_height(y.right))
+        self.update(z)
+        self.update(y)
         return y
 
     def left_rotate(self, z: AVLNode) -> AVLNode:
@@ -42,87 +172,260 @@ class AVLTree:
         T2 = y.left
         y.left = z
         z.right = T2
-        z.height = 1 + max(self.get_height(z.left), self.get_height(z.right))
-        y.height = 1 + max(self.get_height(y.left), self.get_height(y.right))
+        self.update(z)
+        self.update(y)
         return y
 
-    def insert(self, node: AVLNode, key: int) -> AVLNode:
-        if not node:
-            return AVLNode(key)
-        elif key < node.key:
-            node.left = self.insert(node.left, key)
-        else:
-            node.right = self.insert(node.right, key)
-        node.height = 1 + max(self.get_height(node.left), self.get_height(node.right))
+    def rebalance(self, node: AVLNode) -> AVLNode:
+        self.update(node)
         balance = self.get_balance(node)
-        if balance > 1 and key < node.left.key:
+        if balance > 1:
+            if self.get_balance(node.left) < 0:
+                node.left = self.left_rotate(node.left)
             return self.right_rotate(node)
-        if balance < -1 and key > node.right.key:
-            return self.left_rotate(node)
-        if balance > 1 and key > node.left.key:
-            node.left = self.left_rotate(node.left)
-            return self.right_rotate(node)
-        if balance < -1 and key < node.right.key:
-            node.right = self.right_rotate(node.right)
+        if balance < -1:
+            if self.get_balance(node.right) > 0:
+                node.right = self.right_rotate(node.right)
             return self.left_rotate(node)
         return node
 
-    def insert_key(self, key: int):
-        self.root = self.insert(self.root, key)
+    def _retrace(self, path: list) -> AVLNode:
+        # Rebalances the nodes on `path` bottom-up and relinks rotated subtrees
+        # to their parents. Once a subtree keeps its height its ancestors are
+        # balanced already, so only their sizes still need refreshing.
+        for i in range(len(path) - 1, -1, -1):
+            node = path[i]
+            old_height = node.height
+            subtree = self.rebalance(node)
+            if i == 0:
+                return subtree
+            parent = path[i - 1]
+            if subtree is not node:
+                if parent.left is node:
+                    parent.left = subtree
+                else:
+                    parent.right = subtree
+            if subtree.height == old_height:
+                if self.order_statistics:
+                    for ancestor in reversed(path[:i]):
+                        self.update(ancestor)
+                return path[0]
 
-    def delete(self, node: AVLNode, key: int) -> AVLNode:
+    def insert(self, node: AVLNode, key: int, value=None) -> AVLNode:
         if not node:
-            return node
-        if key < node.key:
-            node.left = self.delete(node.left, key)
-        elif key > node.key:
-            node.right = self.delete(node.right, key)
+            return self.node_class(key, value)
+        path = []
+        current = node
+        while current:
+            path.append(current)
+            current = current.left if key < current.key else current.right
+        parent = path[-1]
+        if key < parent.key:
+            parent.left = self.node_class(key, value)
         else:
-            if not node.left:
-                temp = node.right
-                node = None
-                return temp
-            elif not node.right:
-                temp = node.left
-                node = None
-                return temp
-            else:
-                temp = self.get_min_value_node(node.right)
-                node.key = temp.key
-                node.right = self.delete(node.right, temp.key)
-        if not node:
-            return node
-        node.height = 1 + max(self.get_height(node.left), self.get_height(node.right))
-        balance = self.get_balance(node)
+            parent.right = self.node_class(key, value)
+        return self._retrace(path)
 
-        if balance > 1 and self.get_balance(node.left) >= 0:
-            return self.right_rotate(node)
-        if balance > 1 and self.get_balance(node.left) < 0:
-            node.left = self.left_rotate(node.left)
-            return self.right_rotate(node)
-        if balance < -1 and self.get_balance(node.right) <= 0:
-            return self.left_rotate(node)
-        if balance < -1 and self.get_balance(node.right) > 0:
-            node.right = self.right_rotate(node.right)
-            return self.left_rotate(node)
-        return node
+    def insert_key(self, key: int, value=None):
+        self.root = self.insert(self.root, key, value)
+
+    def delete(self, node: AVLNode, key: int, removed: list = None) -> AVLNode:
+        # Appends the removed node's value to `removed` when given.
+        path = []
+        current = node
+        while current and current.key != key:
+            path.append(current)
+            current = current.left if key < current.key else current.right
+        if not current:
+            return node
+        if removed is not None:
+            removed.append(current.value)
+        if current.left and current.right:
+            # Take over the in-order successor's key and unlink the successor,
+            # which has no left child.
+            path.append(current)
+            successor = current.right
+            while successor.left:
+                path.append(successor)
+                successor = successor.left
+            current.key = successor.key
+            current.value = successor.value
+            current = successor
+        replacement = current.left or current.right
+        if not path:
+            return replacement
+        parent = path[-1]
+        if parent.left is current:
+            parent.left = replacement
+        else:
+            parent.right = replacement
+        return self._retrace(path)
 
     def delete_key(self, key: int):
         self.root = self.delete(self.root, key)
 
     def search(self, node: AVLNode, key: int) -> bool:
-        if not node:
-            return False
-        if node.key == key:
-            return True
-        elif key < node.key:
-            return self.search(node.left, key)
-        else:
-            return self.search(node.right, key)
+        current = node
+        while current:
+            if current.key == key:
+                return True
+            current = current.left if key < current.key else current.right
+        return False
 
     def search_key(self, key: int) -> bool:
         return self.search(self.root, key)
 
+    def _find(self, key: int) -> AVLNode:
+        current = self.root
+        while current and current.key != key:
+            current = current.left if key < current.key else current.right
+        return current
+
+    def get(self, key: int, default=None):
+        node = self._find(key)
+        return default if node is None else node.value
+
+    def put(self, key: int, value):
+        # Replaces the value of an existing key instead of adding a duplicate;
+        # a new key is attached where the same descent ended.
+        path = []
+        current = self.root
+        while current:
+            if current.key == key:
+                current.value = value
+                return
+            path.append(current)
+            current = current.left if key < current.key else current.right
+        if not path:
+            self.root = self.node_class(key, value)
+            return
+        parent = path[-1]
+        if key < parent.key:
+            parent.left = self.node_class(key, value)
+        else:
+            parent.right = self.node_class(key, value)
+        self.root = self._retrace(path)
+
+    def pop(self, key: int, *default):
+        removed = []
+        self.root = self.delete(self.root, key, removed)
+        if not removed:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        return removed[0]
+
+    def items(self, lo: int = None, hi: int = None, reverse: bool = False):
+        # (key, value) pairs for the keys in [lo, hi], in order.
+        for node in self._iter_nodes(lo, hi, reverse):
+            yield node.key, node.value
+
+    def search_many(self, keys) -> np.ndarray:
+        # The probes are sorted once and split around every node key, so
+        # neighbouring probes share the descent down to where they diverge.
+        keys = np.asarray(keys).ravel()
+        order = np.argsort(keys, kind="stable")
+        probes = keys[order].tolist()
+        found = [False] * len(probes)
+        stack = [(self.root, 0, len(probes))]
+        while stack:
+            node, lo, hi = stack.pop()
+            if not node or lo >= hi:
+                continue
+            first = bisect.bisect_left(probes, node.key, lo, hi)
+            last = bisect.bisect_right(probes, node.key, first, hi)
+            for i in range(first, last):
+                found[i] = True
+            stack.append((node.left, lo, first))
+            stack.append((node.right, last, hi))
+        mask = np.empty(len(probes), dtype=bool)
+        mask[order] = found
+        return mask
+
+    def iter_range(self, lo: int = None, hi: int = None, reverse: bool = False):
+        for node in self._iter_nodes(lo, hi, reverse):
+            yield node.key
+
+    def count_range(self, lo: int = None, hi: int = None) -> int:
+        if not self.order_statistics:
+            return sum(1 for _ in self._iter_nodes(lo, hi, False))
+        upper = self.get_size(self.root) if hi is None else self._rank(hi, inclusive=True)
+        lower = 0 if lo is None else self._rank(lo, inclusive=False)
+        return max(upper - lower, 0)
+
+    def rank(self, key: int) -> int:
+        if not self.order_statistics:
+            return sum(1 for _ in takewhile(lambda k: k < key, self.iter_range()))
+        return self._rank(key, inclusive=False)
+
+    def select(self, i: int) -> int:
+        if not self.order_statistics:
+            if i >= 0:
+                for key in islice(self.iter_range(), i, None):
+                    return key
+            raise IndexError("select index out of range")
+        if not 0 <= i < self.get_size(self.root):
+            raise IndexError("select index out of range")
+        current = self.root
+        while True:
+            left_size = self.get_size(current.left)
+            if i < left_size:
+                current = current.left
+            elif i == left_size:
+                return current.key
+            else:
+                i -= left_size + 1
+                current = current.right
+
+    def quantile(self, q: float) -> int:
+        if not 0 <= q <= 1:
+            raise ValueError("quantile must be between 0 and 1")
+        size = self.get_size(self.root) if self.order_statistics else self.count_range()
+        if not size:
+            raise IndexError("quantile of an empty tree")
+        return self.select(int(q * (size - 1)))
+
+    def _rank(self, key: int, inclusive: bool) -> int:
+        # Counts the keys below `key` (or up to it when inclusive) by adding
+        # the left subtree sizes of every node the descent passes on its right.
+        rank = 0
+        current = self.root
+        while current:
+            if current.key < key or (inclusive and current.key == key):
+                rank += 1 + self.get_size(current.left)
+                current = current.right
+            else:
+                current = current.left
+        return rank
+
+    def __iter__(self):
+        return self.iter_range()
+
+    def __reversed__(self):
+        return self.iter_range(reverse=True)
+
+    def _iter_nodes(self, lo: int, hi: int, reverse: bool):
+        # In-order walk over [lo, hi] (inclusive, None means unbounded) with an
+        # explicit stack of pending ancestors, so memory stays O(height).
+        if reverse:
+            lo, hi = hi, lo
+        stack = []
+        current = self.root
+        while True:
+            while current:
+                if lo is not None and (current.key > lo if reverse else current.key < lo):
+                    current = current.left if reverse else current.right
+                else:
+                    stack.append(current)
+                    current = current.right if reverse else current.left
+            if not stack:
+                return
+            node = stack.pop()
+            if hi is not None and (node.key < hi if reverse else node.key > hi):
+                return
+            yield node
+            current = node.left if reverse else node.right
+
     def search_key_with_path(self, key: int):
         path = []
         current = self.root
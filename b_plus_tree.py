@@ -0,0 +1,405 @@
+import gc
+
+import numpy as np
+
+from b_tree import SortedKeysMixin
+
+
+class BPlusTreeNode(SortedKeysMixin):
+    __slots__ = ['t', 'leaf', 'keys', 'children', 'copies', 'next', 'prev', 'n']
+
+    def __init__(self, t: int, leaf: bool = True, key_dtype=int):
+        self.t = t
+        self.leaf = leaf
+        self.keys = np.empty((2 * t - 1,), dtype=key_dtype)
+        # Internal nodes hold separators and children only; leaves hold every
+        # key once, with its multiplicity, and link to their neighbours.
+        self.children = None if leaf else [None] * (2 * t)
+        self.copies = np.empty((2 * t - 1,), dtype=np.uint32) if leaf else None
+        self.next = None
+        self.prev = None
+        self.n = 0
+
+    def __str__(self):
+        valid_keys = [str(key) for key in self.keys[:self.n]]
+        return f"BPlusTreeNode(keys={valid_keys}, leaf={self.leaf})"
+
+
+class BPlusTree:
+    # Child i of an internal node holds the keys in [keys[i - 1], keys[i]).
+    # Separators are copies of keys and may outlive the key they copied.
+    def __init__(self, t: int, key_dtype=int):
+        if t < 2:
+            raise ValueError("minimum degree must be at least 2")
+        self.t = t
+        self.key_dtype = np.dtype(key_dtype)
+        self.root = self._new_node(leaf=True)
+        self.size = 0  # Keys stored, counting every copy
+
+    @classmethod
+    def from_sorted(cls, keys, t: int, fill: float = 1.0, key_dtype=int):
+        tree = cls(t, key_dtype=key_dtype)
+        tree.bulk_load(keys, fill)
+        return tree
+
+    def _new_node(self, leaf: bool) -> BPlusTreeNode:
+        return BPlusTreeNode(self.t, leaf=leaf, key_dtype=self.key_dtype)
+
+    def _first_leaf(self) -> BPlusTreeNode:
+        node = self.root
+        while not node.leaf:
+            node = node.children[0]
+        return node
+
+    def _last_leaf(self) -> BPlusTreeNode:
+        node = self.root
+        while not node.leaf:
+            node = node.children[node.n]
+        return node
+
+    def _find_leaf(self, k: int) -> BPlusTreeNode:
+        node = self.root
+        while not node.leaf:
+            node = node.children[node.upper_bound(k)]
+        return node
+
+    def bulk_load(self, keys, fill: float = 1.0):
+        # Packs the distinct keys into linked leaves left to right, then builds
+        # each internal level over the one below, separating neighbouring
+        # children by the smallest key of the right one.
+        keys, copies = np.unique(np.asarray(keys, dtype=self.key_dtype).ravel(), return_counts=True)
+        size = int(copies.sum())
+        t = self.t
+        capacity = min(2 * t - 1, max(t - 1, int(round(fill * (2 * t - 1)))))
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            nodes = []
+            for lo, hi in self._pack_bounds(len(keys), capacity, 0):
+                leaf = self._new_node(leaf=True)
+                leaf.keys[:hi - lo] = keys[lo:hi]
+                leaf.copies[:hi - lo] = copies[lo:hi]
+                leaf.n = hi - lo
+                if nodes:
+                    nodes[-1].next = leaf
+                    leaf.prev = nodes[-1]
+                nodes.append(leaf)
+            if not nodes:
+                nodes.append(self._new_node(leaf=True))
+            lows = [node.keys[0] for node in nodes]
+            while len(nodes) > 1:
+                parents = []
+                parent_lows = []
+                for lo, hi in self._pack_bounds(len(nodes), capacity + 1, 1):
+                    parent = self._new_node(leaf=False)
+                    parent.children[:hi - lo] = nodes[lo:hi]
+                    parent.keys[:hi - lo - 1] = lows[lo + 1:hi]
+                    parent.n = hi - lo - 1
+                    parents.append(parent)
+                    parent_lows.append(lows[lo])
+                nodes, lows = parents, parent_lows
+        finally:
+            if gc_enabled:
+                gc.enable()
+        self.root = nodes[0]
+        self.size = size
+
+    def _pack_bounds(self, count: int, capacity: int, extra: int):
+        # Splits `count` entries into groups of at most `capacity` that all hold
+        # at least t - 1 + extra of them (a lone group may hold fewer): leaves
+        # take t - 1 keys, internal nodes t children.
+        if count <= capacity:
+            return [(0, count)] if count else []
+        groups = -(-count // capacity)
+        groups = max(1, min(groups, count // (self.t - 1 + extra)))
+        base, rest = divmod(count, groups)
+        bounds = []
+        lo = 0
+        for j in range(groups):
+            hi = lo + base + (1 if j < rest else 0)
+            bounds.append((lo, hi))
+            lo = hi
+        return bounds
+
+    def insert_many(self, keys) -> int:
+        batch = np.sort(np.asarray(keys, dtype=self.key_dtype).ravel())
+        if self.root.n == 0 or len(batch) >= len(self):
+            self.bulk_load(np.concatenate([np.fromiter(self, dtype=self.key_dtype), batch]))
+        else:
+            for k in batch.tolist():
+                self.insert_key(k)
+        return len(batch)
+
+    def delete_many(self, keys) -> int:
+        removed = 0
+        for k in np.sort(np.asarray(keys).ravel()).tolist():
+            removed += self.delete_key(k)
+        return removed
+
+    def __len__(self):
+        return self.size
+
+    def traverse(self, node: BPlusTreeNode = None):
+        for k in self.iter_range():
+            print(k, end=" ")
+
+    def search(self, node: BPlusTreeNode, k: int):
+        while not node.leaf:
+            node = node.children[node.upper_bound(k)]
+        i = node.lower_bound(k)
+        if i < node.n and node.keys[i] == k:
+            return (node, i)
+        return None
+
+    def search_key(self, k: int):
+        return self.search(self.root, k) is not None
+
+    def search_many(self, keys) -> np.ndarray:
+        # Sorted probes are routed a contiguous run per child, so neighbouring
+        # probes share the descent, and each leaf answers its run at once.
+        keys = np.asarray(keys).ravel()
+        order = np.argsort(keys, kind="stable")
+        probes = keys[order]
+        found = np.zeros(len(probes), dtype=bool)
+        stack = [(self.root, 0, len(probes))] if len(probes) else []
+        while stack:
+            node, lo, hi = stack.pop()
+            segment = probes[lo:hi]
+            node_keys = node.keys[:node.n]
+            if node.leaf:
+                idx = node_keys.searchsorted(segment, side="left")
+                hit = idx < node.n
+                hit[hit] = node_keys[idx[hit]] == segment[hit]
+                found[lo:hi] = hit
+                continue
+            idx = node_keys.searchsorted(segment, side="right")
+            bounds = np.flatnonzero(idx[1:] != idx[:-1]) + 1
+            starts = [0] + bounds.tolist()
+            ends = bounds.tolist() + [hi - lo]
+            for start, end in zip(starts, ends):
+                stack.append((node.children[idx[start]], lo + start, lo + end))
+        mask = np.empty(len(probes), dtype=bool)
+        mask[order] = found
+        return mask
+
+    def search_key_with_path(self, k: int):
+        path = [self.root]
+        node = self.root
+        while not node.leaf:
+            node = node.children[node.upper_bound(k)]
+            path.append(node)
+        i = node.lower_bound(k)
+        return i < node.n and node.keys[i] == k, path
+
+    def iter_range(self, lo: int = None, hi: int = None, reverse: bool = False):
+        for block in self.iter_blocks(lo, hi, reverse):
+            yield from block.tolist()
+
+    def count_range(self, lo: int = None, hi: int = None) -> int:
+        return sum(len(block) for block in self.iter_blocks(lo, hi))
+
+    def __iter__(self):
+        return self.iter_range()
+
+    def __reversed__(self):
+        return self.iter_range(reverse=True)
+
+    def iter_blocks(self, lo: int = None, hi: int = None, reverse: bool = False):
+        # Yields the keys in [lo, hi] (inclusive, None means unbounded) one leaf
+        # run at a time, following the leaf links: NumPy views into the leaves
+        # unless a run holds duplicates. Views are only valid until the next
+        # mutation.
+        if reverse:
+            return self._iter_blocks_reverse(lo, hi)
+        return self._iter_blocks_forward(lo, hi)
+
+    def _iter_blocks_forward(self, lo: int, hi: int):
+        node = self._first_leaf() if lo is None else self._find_leaf(lo)
+        start = 0 if lo is None else node.lower_bound(lo)
+        while node is not None:
+            end = node.n if hi is None else node.upper_bound(hi)
+            if start < end:
+                yield self._run(node, start, end)
+            if end < node.n:
+                return
+            node = node.next
+            start = 0
+
+    def _iter_blocks_reverse(self, lo: int, hi: int):
+        node = self._last_leaf() if hi is None else self._find_leaf(hi)
+        end = node.n if hi is None else node.upper_bound(hi)
+        while node is not None:
+            start = 0 if lo is None else node.lower_bound(lo)
+            if start < end:
+                yield self._run(node, start, end)[::-1]
+            if start > 0:
+                return
+            node = node.prev
+            if node is not None:
+                end = node.n
+
+    def _run(self, leaf: BPlusTreeNode, start: int, end: int) -> np.ndarray:
+        copies = leaf.copies[start:end]
+        if copies.max() == 1:
+            return leaf.keys[start:end]
+        return np.repeat(leaf.keys[start:end], copies)
+
+    def insert_key(self, k: int, value=None):
+        if value is not None:
+            raise TypeError("BPlusTree leaves hold keys only")
+        root = self.root
+        if root.n == 2 * self.t - 1:
+            s = self._new_node(leaf=False)
+            s.children[0] = root
+            self.split_child(s, 0)
+            self.root = s
+        node = self.root
+        while not node.leaf:
+            i = node.upper_bound(k)
+            if node.children[i].n == 2 * self.t - 1:
+                self.split_child(node, i)
+                if k >= node.keys[i]:
+                    i += 1
+            node = node.children[i]
+        self.size += 1
+        i = node.lower_bound(k)
+        if i < node.n and node.keys[i] == k:
+            node.copies[i] += 1
+            return
+        n = node.n
+        node.keys[i + 1:n + 1] = node.keys[i:n]
+        node.copies[i + 1:n + 1] = node.copies[i:n]
+        node.keys[i] = k
+        node.copies[i] = 1
+        node.n += 1
+
+    def split_child(self, parent: BPlusTreeNode, i: int):
+        # A full leaf keeps t - 1 keys and copies the first of the t it hands to
+        # its new right neighbour into the parent; a full internal node moves
+        # its middle separator up, as in BTree.
+        t = self.t
+        node_to_split = parent.children[i]
+        new_node = self._new_node(leaf=node_to_split.leaf)
+        if node_to_split.leaf:
+            new_node.keys[:t] = node_to_split.keys[t - 1:2 * t - 1]
+            new_node.copies[:t] = node_to_split.copies[t - 1:2 * t - 1]
+            new_node.n = t
+            separator = new_node.keys[0]
+            new_node.next = node_to_split.next
+            new_node.prev = node_to_split
+            if node_to_split.next is not None:
+                node_to_split.next.prev = new_node
+            node_to_split.next = new_node
+        else:
+            new_node.keys[:t - 1] = node_to_split.keys[t:2 * t - 1]
+            new_node.children[:t] = node_to_split.children[t:2 * t]
+            node_to_split.children[t:2 * t] = [None] * t
+            new_node.n = t - 1
+            separator = node_to_split.keys[t - 1]
+        node_to_split.n = t - 1
+
+        n = parent.n
+        parent.children[i + 2:n + 2] = parent.children[i + 1:n + 1]
+        parent.children[i + 1] = new_node
+        parent.keys[i + 1:n + 1] = parent.keys[i:n]
+        parent.keys[i] = separator
+        parent.n += 1
+
+    def delete_key(self, k: int) -> bool:
+        # Removes one copy of k. Every child is topped up to t keys before the
+        # descent enters it, so the leaf can always give one up.
+        node = self.root
+        while not node.leaf:
+            i = node.upper_bound(k)
+            if node.children[i].n < self.t:
+                self.fill_child(node, i)
+                i = node.upper_bound(k)
+            node = node.children[i]
+        if self.root.n == 0 and not self.root.leaf:
+            self.root = self.root.children[0]
+
+        i = node.lower_bound(k)
+        if i == node.n or node.keys[i] != k:
+            return False
+        self.size -= 1
+        if node.copies[i] > 1:
+            node.copies[i] -= 1
+            return True
+        node.keys[i:node.n - 1] = node.keys[i + 1:node.n]
+        node.copies[i:node.n - 1] = node.copies[i + 1:node.n]
+        node.n -= 1
+        return True
+
+    def fill_child(self, node: BPlusTreeNode, idx: int):
+        t = self.t
+        if idx > 0 and node.children[idx - 1].n >= t:
+            self._borrow_from_prev(node, idx)
+        elif idx < node.n and node.children[idx + 1].n >= t:
+            self._borrow_from_next(node, idx)
+        elif idx < node.n:
+            self._merge(node, idx)
+        else:
+            self._merge(node, idx - 1)
+
+    def _borrow_from_prev(self, node: BPlusTreeNode, idx: int):
+        child = node.children[idx]
+        sibling = node.children[idx - 1]
+
+        child.keys[1:child.n + 1] = child.keys[:child.n]
+        if child.leaf:
+            child.copies[1:child.n + 1] = child.copies[:child.n]
+            child.keys[0] = sibling.keys[sibling.n - 1]
+            child.copies[0] = sibling.copies[sibling.n - 1]
+            node.keys[idx - 1] = child.keys[0]
+        else:
+            child.children[1:child.n + 2] = child.children[:child.n + 1]
+            child.keys[0] = node.keys[idx - 1]
+            child.children[0] = sibling.children[sibling.n]
+            sibling.children[sibling.n] = None
+            node.keys[idx - 1] = sibling.keys[sibling.n - 1]
+        sibling.n -= 1
+        child.n += 1
+
+    def _borrow_from_next(self, node: BPlusTreeNode, idx: int):
+        child = node.children[idx]
+        sibling = node.children[idx + 1]
+
+        if child.leaf:
+            child.keys[child.n] = sibling.keys[0]
+            child.copies[child.n] = sibling.copies[0]
+            sibling.copies[:sibling.n - 1] = sibling.copies[1:sibling.n]
+            node.keys[idx] = sibling.keys[1]
+        else:
+            child.keys[child.n] = node.keys[idx]
+            child.children[child.n + 1] = sibling.children[0]
+            sibling.children[:sibling.n] = sibling.children[1:sibling.n + 1]
+            sibling.children[sibling.n] = None
+            node.keys[idx] = sibling.keys[0]
+        sibling.keys[:sibling.n - 1] = sibling.keys[1:sibling.n]
+        sibling.n -= 1
+        child.n += 1
+
+    def _merge(self, node: BPlusTreeNode, idx: int):
+        # Leaves simply concatenate and drop the separator between them;
+        # internal nodes pull it down between their children, as in BTree.
+        child = node.children[idx]
+        sibling = node.children[idx + 1]
+        n = child.n
+
+        if child.leaf:
+            child.keys[n:n + sibling.n] = sibling.keys[:sibling.n]
+            child.copies[n:n + sibling.n] = sibling.copies[:sibling.n]
+            child.n += sibling.n
+            child.next = sibling.next
+            if sibling.next is not None:
+                sibling.next.prev = child
+        else:
+            child.keys[n] = node.keys[idx]
+            child.keys[n + 1:n + 1 + sibling.n] = sibling.keys[:sibling.n]
+            child.children[n + 1:n + 2 + sibling.n] = sibling.children[:sibling.n + 1]
+            child.n += sibling.n + 1
+
+        node.keys[idx:node.n - 1] = node.keys[idx + 1:node.n]
+        node.children[idx + 1:node.n] = node.children[idx + 2:node.n + 1]
+        node.children[node.n] = None
+        node.n -= 1
@@ -1,11 +1,50 @@
+import gc
+from itertools import islice, takewhile
+
 import numpy as np
 
-class BTreeNode:
-    def __init__(self, t: int, leaf: bool = True):
+# Nodes holding at most this many keys are scanned linearly; above it the
+# per-call overhead of np.searchsorted is cheaper than a Python loop.
+LINEAR_SEARCH_MAX = 8
+
+
+class SortedKeysMixin:
+    # Binary-or-linear search over keys[:n], shared by BTreeNode and
+    # BPlusTreeNode.
+    __slots__ = ()
+
+    def lower_bound(self, k: int) -> int:
+        n = self.n
+        if n > LINEAR_SEARCH_MAX:
+            return int(self.keys[:n].searchsorted(k, side="left"))
+        keys = self.keys
+        i = 0
+        while i < n and keys[i] < k:
+            i += 1
+        return i
+
+    def upper_bound(self, k: int) -> int:
+        n = self.n
+        if n > LINEAR_SEARCH_MAX:
+            return int(self.keys[:n].searchsorted(k, side="right"))
+        keys = self.keys
+        i = 0
+        while i < n and keys[i] <= k:
+            i += 1
+        return i
+
+
+class BTreeNode(SortedKeysMixin):
+    __slots__ = ['t', 'leaf', 'keys', 'children', 'counts', 'values', 'n']
+
+    def __init__(self, t: int, leaf: bool = True, key_dtype=int, value_dtype=None):
         self.t = t
         self.leaf = leaf
-        self.keys = np.full((2 * t - 1,), fill_value=-1, dtype=int)
-        self.children = [None] * (2 * t)
+        self.keys = np.empty((2 * t - 1,), dtype=key_dtype)
+        self.children = None if leaf else [None] * (2 * t)  # Leaves never hold children
+        self.counts = None  # Keys below each child, kept with order statistics
+        # The value stored with each key, kept when the tree is used as a map
+        self.values = None if value_dtype is None else np.empty((2 * t - 1,), dtype=value_dtype)
         self.n = 0
 
     def __str__(self):
@@ -14,9 +53,183 @@ class BTreeNode:
 
 
 class BTree:
-    def __init__(self, t: int):
+    value_dtype = None
+
+    def __init__(self, t: int, order_statistics: bool = False, key_dtype=int, value_dtype=None):
         self.t = t
-        self.root = BTreeNode(t, leaf=True)
+        self.order_statistics = order_statistics
+        self.key_dtype = np.dtype(key_dtype)
+        # With a value_dtype (object for arbitrary payloads) every key carries a
+        # value; keys inserted without one read back as None, or 0 when typed.
+        if value_dtype is not None:
+            self.value_dtype = np.dtype(value_dtype)
+            self.missing_value = None if self.value_dtype == object else self.value_dtype.type(0)
+        self.root = self._new_node(leaf=True)
+
+    @classmethod
+    def from_sorted(cls, keys, t: int, fill: float = 1.0, order_statistics: bool = False, key_dtype=int,
+                    values=None, value_dtype=None):
+        tree = cls(t, order_statistics=order_statistics, key_dtype=key_dtype, value_dtype=value_dtype)
+        tree.bulk_load(keys, fill, values)
+        return tree
+
+    def _new_node(self, leaf: bool) -> BTreeNode:
+        node = BTreeNode(self.t, leaf=leaf, key_dtype=self.key_dtype, value_dtype=self.value_dtype)
+        if self.order_statistics and not leaf:
+            node.counts = np.zeros(2 * self.t, dtype=np.int64)
+        return node
+
+    def _release_node(self, node: BTreeNode):
+        # Called for nodes that drop out of the tree; storage-backed subclasses
+        # reclaim them, in memory the garbage collector does.
+        pass
+
+    def _subtree_size(self, node: BTreeNode) -> int:
+        if node.counts is None:
+            return node.n
+        return node.n + int(node.counts[:node.n + 1].sum())
+
+    def bulk_load(self, keys, fill: float = 1.0, values=None):
+        # Builds the tree bottom-up: every level is packed left to right and the
+        # keys between neighbouring nodes are promoted as the next level's keys.
+        keys = np.asarray(keys, dtype=self.key_dtype).ravel()
+        if self.value_dtype is None:
+            if values is not None:
+                raise ValueError(f"{type(self).__name__} was created without a value_dtype and cannot store values")
+            keys = np.sort(keys)
+        else:
+            order = np.argsort(keys, kind="stable")
+            keys = keys[order]
+            values = self._value_array(values, len(keys))[order]
+        t = self.t
+        capacity = min(2 * t - 1, max(t - 1, int(round(fill * (2 * t - 1)))))
+        children = None
+        sizes = None
+        # Node allocation would otherwise trigger repeated full collections.
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            while True:
+                nodes, separators, sizes = self._pack_level(keys, children, sizes, capacity, values)
+                if len(nodes) == 1:
+                    break
+                keys = keys[separators]
+                if values is not None:
+                    values = values[separators]
+                children = nodes
+        finally:
+            if gc_enabled:
+                gc.enable()
+        self.root = nodes[0]
+
+    def _value_array(self, values, size: int) -> np.ndarray:
+        if values is None:
+            return np.full(size, self.missing_value, dtype=self.value_dtype)
+        values = np.asarray(values, dtype=self.value_dtype).ravel()
+        if len(values) != size:
+            raise ValueError(f"got {len(values)} values for {size} keys")
+        return values
+
+    def insert_many(self, keys) -> int:
+        batch = np.sort(np.asarray(keys, dtype=self.key_dtype).ravel())
+        if self._prefers_rebuild(len(batch)):
+            existing, values = self._sorted_items()
+            if values is not None:
+                values = np.concatenate([values, self._value_array(None, len(batch))])
+            self.bulk_load(np.concatenate([existing, batch]), values=values)
+        else:
+            for k in batch.tolist():
+                self.insert_key(k)
+        return len(batch)
+
+    def delete_many(self, keys) -> int:
+        batch = np.sort(np.asarray(keys).ravel())
+        if not len(batch):
+            return 0
+        if self._prefers_rebuild(len(batch)):
+            existing, values = self._sorted_items()
+            # Each stored key is dropped while its position within its run of
+            # equal keys is below the number of times the batch asks for it.
+            unique, counts = np.unique(batch, return_counts=True)
+            pos = np.minimum(unique.searchsorted(existing), len(unique) - 1)
+            requested = np.where(unique[pos] == existing, counts[pos], 0)
+            rank = np.arange(len(existing)) - existing.searchsorted(existing, side="left")
+            keep = rank >= requested
+            kept = existing[keep]
+            self.bulk_load(kept, values=None if values is None else values[keep])
+            return len(existing) - len(kept)
+        removed = 0
+        for k in batch.tolist():
+            if self.search(self.root, k) is not None:
+                self.delete_key(k)
+                removed += 1
+        return removed
+
+    def _prefers_rebuild(self, batch_size: int) -> bool:
+        # The fan-out along the leftmost path estimates the key count. Merging
+        # the batch and bulk loading is dominated by allocating the ~n/t nodes,
+        # per-key updates by the m * height node visits.
+        height = 1
+        size = 1
+        node = self.root
+        while not node.leaf:
+            size *= node.n + 1
+            height += 1
+            node = node.children[0]
+        return batch_size * height * self.t >= 4 * size * max(node.n, 1)
+
+    def _sorted_items(self):
+        # All keys in order, with their values alongside (None without values).
+        blocks = []
+        value_blocks = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            blocks.append(node.keys[:node.n])
+            if node.values is not None:
+                value_blocks.append(node.values[:node.n])
+            if not node.leaf:
+                stack.extend(node.children[:node.n + 1])
+        keys = np.concatenate(blocks)
+        if not value_blocks:
+            return np.sort(keys), None
+        order = np.argsort(keys, kind="stable")
+        return keys[order], np.concatenate(value_blocks)[order]
+
+    def _pack_level(self, keys, children, child_sizes, capacity: int, values=None):
+        t = self.t
+        n = len(keys)
+        # Each node except the last consumes `capacity` keys plus one separator;
+        # the count is then clamped so every node ends up with t-1..2t-1 keys.
+        count = -(-(n + 1) // (capacity + 1))
+        count = max(count, -(-(n + 1) // (2 * t)))
+        count = max(1, min(count, (n + 1) // t))
+        base, extra = divmod(n - count + 1, count)
+
+        nodes = []
+        separators = []
+        sizes = []
+        pos = 0
+        for j in range(count):
+            size = base + 1 if j < extra else base
+            node = self._new_node(leaf=children is None)
+            node.keys[:size] = keys[pos:pos + size]
+            if values is not None:
+                node.values[:size] = values[pos:pos + size]
+            node.n = size
+            if children is not None:
+                node.children[:size + 1] = children[pos:pos + size + 1]
+            if node.counts is not None:
+                node.counts[:size + 1] = child_sizes[pos:pos + size + 1]
+                sizes.append(size + int(node.counts[:size + 1].sum()))
+            else:
+                sizes.append(size)
+            pos += size
+            if j < count - 1:
+                separators.append(pos)
+                pos += 1
+            nodes.append(node)
+        return nodes, separators, sizes
 
     def traverse(self, node: BTreeNode):
         i = 0
@@ -29,9 +242,7 @@ class BTree:
             self.traverse(node.children[i])
 
     def search(self, node: BTreeNode, k: int):
-        i = 0
-        while i < node.n and k > node.keys[i]:
-            i += 1
+        i = node.lower_bound(k)
         if i < node.n and node.keys[i] == k:
             return (node, i)
         if node.leaf:
@@ -41,6 +252,232 @@ class BTree:
     def search_key(self, k: int):
         return self.search(self.root, k) is not None
 
+    def _require_values(self):
+        if self.value_dtype is None:
+            raise TypeError(f"{type(self).__name__} was created without a value_dtype")
+
+    def get(self, k: int, default=None):
+        self._require_values()
+        found = self.search(self.root, k)
+        if found is None:
+            return default
+        node, i = found
+        return node.values[i:i + 1].tolist()[0]
+
+    def put(self, k: int, value):
+        # Replaces the value of an existing key instead of adding a duplicate,
+        # in the one descent that would insert it.
+        self._require_values()
+        if self.root.n == 2 * self.t - 1:
+            self._grow_root()
+        self._put(self.root, k, value)
+
+    def _put(self, node: BTreeNode, k: int, value) -> bool:
+        i = node.lower_bound(k)
+        if i < node.n and node.keys[i] == k:
+            node.values[i] = value
+            return False
+        if node.leaf:
+            n = node.n
+            node.keys[i + 1:n + 1] = node.keys[i:n]
+            node.values[i + 1:n + 1] = node.values[i:n]
+            node.keys[i] = k
+            node.values[i] = value
+            node.n += 1
+            return True
+        if node.children[i].n == 2 * self.t - 1:
+            self.split_child(node, i)
+            if node.keys[i] == k:
+                node.values[i] = value
+                return False
+            if k > node.keys[i]:
+                i += 1
+        inserted = self._put(node.children[i], k, value)
+        if inserted and node.counts is not None:
+            node.counts[i] += 1
+        return inserted
+
+    def pop(self, k: int, *default):
+        self._require_values()
+        removed = []
+        if not self._delete(k, removed):
+            if default:
+                return default[0]
+            raise KeyError(k)
+        return removed[0]
+
+    def items(self, lo: int = None, hi: int = None, reverse: bool = False):
+        # (key, value) pairs for the keys in [lo, hi], in order.
+        self._require_values()
+        spans = self._iter_spans_reverse(lo, hi) if reverse else self._iter_spans_forward(lo, hi)
+        for node, start, end in spans:
+            keys = node.keys[start:end].tolist()
+            values = node.values[start:end].tolist()
+            if reverse:
+                keys.reverse()
+                values.reverse()
+            yield from zip(keys, values)
+
+    def search_many(self, keys) -> np.ndarray:
+        # The probes are sorted once and each node routes a contiguous run of
+        # them to every child, so neighbouring probes share the descent.
+        keys = np.asarray(keys).ravel()
+        order = np.argsort(keys, kind="stable")
+        probes = keys[order]
+        found = np.zeros(len(probes), dtype=bool)
+        stack = [(self.root, 0, len(probes))] if len(probes) else []
+        while stack:
+            node, lo, hi = stack.pop()
+            if hi - lo == 1:
+                found[lo] |= self.search(node, probes[lo]) is not None
+                continue
+            segment = probes[lo:hi]
+            node_keys = node.keys[:node.n]
+            idx = node_keys.searchsorted(segment, side="left")
+            hit = idx < node.n
+            hit[hit] = node_keys[idx[hit]] == segment[hit]
+            found[lo:hi] |= hit
+            if node.leaf:
+                continue
+            bounds = np.flatnonzero(idx[1:] != idx[:-1]) + 1
+            starts = [0] + bounds.tolist()
+            ends = bounds.tolist() + [hi - lo]
+            for start, end in zip(starts, ends):
+                if not hit[start:end].all():
+                    stack.append((node.children[idx[start]], lo + start, lo + end))
+        mask = np.empty(len(probes), dtype=bool)
+        mask[order] = found
+        return mask
+
+    def iter_range(self, lo: int = None, hi: int = None, reverse: bool = False):
+        for block in self.iter_blocks(lo, hi, reverse):
+            yield from block.tolist()
+
+    def count_range(self, lo: int = None, hi: int = None) -> int:
+        if not self.order_statistics:
+            return sum(len(block) for block in self.iter_blocks(lo, hi))
+        upper = self._subtree_size(self.root) if hi is None else self._rank(hi, inclusive=True)
+        lower = 0 if lo is None else self._rank(lo, inclusive=False)
+        return max(upper - lower, 0)
+
+    def rank(self, k: int) -> int:
+        if not self.order_statistics:
+            return sum(1 for _ in takewhile(lambda key: key < k, self.iter_range()))
+        return self._rank(k, inclusive=False)
+
+    def select(self, i: int) -> int:
+        if not self.order_statistics:
+            if i >= 0:
+                for key in islice(self.iter_range(), i, None):
+                    return key
+            raise IndexError("select index out of range")
+        if not 0 <= i < self._subtree_size(self.root):
+            raise IndexError("select index out of range")
+        node = self.root
+        while not node.leaf:
+            # Child j and the key after it together cover counts[j] + 1 ranks.
+            ends = np.cumsum(node.counts[:node.n + 1] + 1)
+            j = int(ends.searchsorted(i, side="right"))
+            if j:
+                i -= int(ends[j - 1])
+            if i == node.counts[j]:
+                return int(node.keys[j])
+            node = node.children[j]
+        return int(node.keys[i])
+
+    def quantile(self, q: float) -> int:
+        if not 0 <= q <= 1:
+            raise ValueError("quantile must be between 0 and 1")
+        size = self._subtree_size(self.root) if self.order_statistics else self.count_range()
+        if not size:
+            raise IndexError("quantile of an empty tree")
+        return self.select(int(q * (size - 1)))
+
+    def _rank(self, k: int, inclusive: bool) -> int:
+        rank = 0
+        node = self.root
+        while True:
+            i = node.upper_bound(k) if inclusive else node.lower_bound(k)
+            if node.leaf:
+                return rank + i
+            rank += i + int(node.counts[:i].sum())
+            node = node.children[i]
+
+    def __iter__(self):
+        return self.iter_range()
+
+    def __reversed__(self):
+        return self.iter_range(reverse=True)
+
+    def iter_blocks(self, lo: int = None, hi: int = None, reverse: bool = False):
+        # Yields the keys in [lo, hi] (inclusive, None means unbounded) as NumPy
+        # views into the nodes: a leaf run at a time, and each separator of an
+        # internal node on its own. Views are only valid until the next mutation.
+        if reverse:
+            return (node.keys[start:end][::-1] for node, start, end in self._iter_spans_reverse(lo, hi))
+        return (node.keys[start:end] for node, start, end in self._iter_spans_forward(lo, hi))
+
+    def _iter_spans_forward(self, lo: int, hi: int):
+        # (node, start, end) runs of slots holding the keys in order.
+        stack = []
+        node = self.root
+        while not node.leaf:
+            i = 0 if lo is None else node.lower_bound(lo)
+            stack.append((node, i))
+            node = node.children[i]
+        start = 0 if lo is None else node.lower_bound(lo)
+        while True:
+            end = node.n if hi is None else node.upper_bound(hi)
+            if start < end:
+                yield node, start, end
+            if end < node.n:
+                return
+            while stack:
+                parent, i = stack.pop()
+                if i < parent.n:
+                    break
+            else:
+                return
+            if hi is not None and parent.keys[i] > hi:
+                return
+            yield parent, i, i + 1
+            stack.append((parent, i + 1))
+            node = parent.children[i + 1]
+            while not node.leaf:
+                stack.append((node, 0))
+                node = node.children[0]
+            start = 0
+
+    def _iter_spans_reverse(self, lo: int, hi: int):
+        stack = []
+        node = self.root
+        while not node.leaf:
+            i = node.n if hi is None else node.upper_bound(hi)
+            stack.append((node, i))
+            node = node.children[i]
+        end = node.n if hi is None else node.upper_bound(hi)
+        while True:
+            start = 0 if lo is None else node.lower_bound(lo)
+            if start < end:
+                yield node, start, end
+            if start > 0:
+                return
+            while stack:
+                parent, i = stack.pop()
+                if i > 0:
+                    break
+            else:
+                return
+            if lo is not None and parent.keys[i - 1] < lo:
+                return
+            yield parent, i - 1, i
+            stack.append((parent, i - 1))
+            node = parent.children[i - 1]
+            while not node.leaf:
+                stack.append((node, node.n))
+                node = node.children[node.n]
+            end = node.n
+
     def search_key_with_path(self, k: int):
         path = []
         found = self._search_key_with_path(self.root, k, path)
@@ -48,114 +485,197 @@ class BTree:
 
     def _search_key_with_path(self, node: BTreeNode, k: int, path: list):
         path.append(node)
-        i = 0
-        while i < node.n and k > node.keys[i]:
-            i += 1
+        i = node.lower_bound(k)
         if i < node.n and node.keys[i] == k:
             return True
         if node.leaf:
             return False
         return self._search_key_with_path(node.children[i], k, path)
 
-    def insert_key(self, k: int):
-        root = self.root
-        if root.n == 2 * self.t - 1:
-            s = BTreeNode(self.t, leaf=False)
-            s.children[0] = root
-            self.split_child(s, 0)
-            i = 0
-            if s.keys[0] < k:
-                i += 1
-            self.insert_non_full(s.children[i], k)
-            self.root = s
-        else:
-            self.insert_non_full(root, k)
+    def insert_key(self, k: int, value=None):
+        if value is not None:
+            self._require_values()
+        if self.root.n == 2 * self.t - 1:
+            self._grow_root()
+        self.insert_non_full(self.root, k, value)
 
-    def insert_non_full(self, node: BTreeNode, k: int):
-        i = node.n - 1
+    def _grow_root(self):
+        root = self.root
+        s = self._new_node(leaf=False)
+        s.children[0] = root
+        if s.counts is not None:
+            s.counts[0] = self._subtree_size(root)
+        self.split_child(s, 0)
+        self.root = s
+
+    def insert_non_full(self, node: BTreeNode, k: int, value=None):
+        i = node.upper_bound(k)
         if node.leaf:
-            while i >= 0 and k < node.keys[i]:
-                node.keys[i + 1] = node.keys[i]
-                i -= 1
-            node.keys[i + 1] = k
+            n = node.n
+            node.keys[i + 1:n + 1] = node.keys[i:n]
+            node.keys[i] = k
+            if node.values is not None:
+                node.values[i + 1:n + 1] = node.values[i:n]
+                node.values[i] = self.missing_value if value is None else value
             node.n += 1
         else:
-            while i >= 0 and k < node.keys[i]:
-                i -= 1
-            i += 1
             if node.children[i].n == 2 * self.t - 1:
                 self.split_child(node, i)
                 if k > node.keys[i]:
                     i += 1
-            self.insert_non_full(node.children[i], k)
+            if node.counts is not None:
+                node.counts[i] += 1
+            self.insert_non_full(node.children[i], k, value)
 
     def split_child(self, parent: BTreeNode, i: int):
         t = self.t
         node_to_split = parent.children[i]
-        new_node = BTreeNode(t, leaf=node_to_split.leaf)
+        new_node = self._new_node(leaf=node_to_split.leaf)
         new_node.n = t - 1
 
-        for j in range(t - 1):
-            new_node.keys[j] = node_to_split.keys[j + t]
+        new_node.keys[:t - 1] = node_to_split.keys[t:2 * t - 1]
+        if new_node.values is not None:
+            new_node.values[:t - 1] = node_to_split.values[t:2 * t - 1]
         if not node_to_split.leaf:
-            for j in range(t):
-                new_node.children[j] = node_to_split.children[j + t]
+            new_node.children[:t] = node_to_split.children[t:2 * t]
+        if new_node.counts is not None:
+            new_node.counts[:t] = node_to_split.counts[t:2 * t]
         node_to_split.n = t - 1
 
-        for j in range(parent.n, i, -1):
-            parent.children[j + 1] = parent.children[j]
+        n = parent.n
+        parent.children[i + 2:n + 2] = parent.children[i + 1:n + 1]
         parent.children[i + 1] = new_node
+        if parent.counts is not None:
+            left_size = self._subtree_size(node_to_split)
+            parent.counts[i + 2:n + 2] = parent.counts[i + 1:n + 1]
+            parent.counts[i + 1] = parent.counts[i] - left_size - 1
+            parent.counts[i] = left_size
 
-        for j in range(parent.n - 1, i - 1, -1):
-            parent.keys[j + 1] = parent.keys[j]
+        parent.keys[i + 1:n + 1] = parent.keys[i:n]
         parent.keys[i] = node_to_split.keys[t - 1]
+        if parent.values is not None:
+            parent.values[i + 1:n + 1] = parent.values[i:n]
+            parent.values[i] = node_to_split.values[t - 1]
 
         parent.n += 1
 
     def delete_key(self, k: int):
-        self._delete_internal(self.root, k)
-        if self.root.n == 0 and not self.root.leaf:
-            self.root = self.root.children[0]
-
-    def _delete_internal(self, node: BTreeNode, k: int):
+        self._delete(k)
+
+    def _delete(self, k: int, removed: list = None) -> bool:
+        # Deletes the entry a search for k finds first, appending its value to
+        # `removed` when given. Counts are decremented on the way down, so with
+        # order statistics they need to know first whether k is there.
+        removes = not self.order_statistics or self.search(self.root, k) is not None
+        return self._delete_descent(k, removes, removed)
+
+    def _delete_descent(self, k: int, removes: bool, removed: list = None) -> bool:
+        # Single top-down pass that fills every child before entering it, so a
+        # step only works on the node, the child (and its siblings while they
+        # are rebalanced) and `pending`. A key found in an internal node is
+        # replaced by the last entry of its left subtree (or first of the right
+        # one): that node stays pending while the descent continues in "max"
+        # ("min") mode and takes the replacement off a leaf. When a merge pulls
+        # the key down instead, "slot" mode follows it by position, so among
+        # duplicates exactly the entry found is removed.
         t = self.t
-        idx = 0
-        while idx < node.n and node.keys[idx] < k:
-            idx += 1
-
-        if idx < node.n and node.keys[idx] == k:
-            if node.leaf:
-                for i in range(idx, node.n - 1):
-                    node.keys[i] = node.keys[i + 1]
-                node.n -= 1
+        hold = self._hold
+        let_go = self._let_go
+        node = self._hold_root()
+        first = True
+        pending = None
+        mode = None
+        slot = None
+        while not node.leaf:
+            held = [node]
+            if mode is None:
+                idx = node.lower_bound(k)
+                hit = idx < node.n and node.keys[idx] == k
+            elif mode == "max":
+                idx, hit = node.n, False
+            elif mode == "min":
+                idx, hit = 0, False
             else:
+                idx, hit, mode = slot, True, None
+            if hit:
+                held += hold(node, idx, idx + 1)
                 if node.children[idx].n >= t:
-                    predecessor = self._get_predecessor(node.children[idx])
-                    node.keys[idx] = predecessor
-                    self._delete_internal(node.children[idx], predecessor)
+                    pending, mode = (node, idx), "max"
                 elif node.children[idx + 1].n >= t:
-                    successor = self._get_successor(node.children[idx + 1])
-                    node.keys[idx] = successor
-                    self._delete_internal(node.children[idx + 1], successor)
+                    pending, mode = (node, idx), "min"
+                    idx += 1
                 else:
                     self._merge(node, idx)
-                    self._delete_internal(node.children[idx], k)
+                    mode, slot = "slot", t - 1
+            else:
+                held += hold(node, idx)
+                if node.children[idx].n < t:
+                    held += hold(node, idx - 1, idx + 1)
+                    self.fill_child(node, idx)
+                    # Filling the last child merges it into its left sibling.
+                    if idx > node.n:
+                        idx -= 1
+            if removes and node.counts is not None:
+                node.counts[idx] -= 1
+            child = node.children[idx]
+            if node.n == 0:
+                # Only the root can be emptied by a merge below it.
+                self.root = child
+                self._release_node(node)
+            if first:
+                self._root_settled()
+                first = False
+            if pending is None:
+                let_go(held, child)
+            else:
+                let_go(held, child, pending[0])
+            node = child
+
+        if mode == "max":
+            idx = node.n - 1
+        elif mode == "min":
+            idx = 0
+        elif mode == "slot":
+            idx = slot
         else:
-            if node.leaf:
-                return
-            if node.children[idx].n < t:
-                self.fill_child(node, idx)
-            self._delete_internal(node.children[idx], k)
-
-    def _get_predecessor(self, node: BTreeNode):
-        while not node.leaf:
-            node = node.children[node.n]
-        return node.keys[node.n - 1]
-
-    def _get_successor(self, node: BTreeNode):
-        while not node.leaf:
-            node = node.children[0]
-        return node.keys[0]
+            idx = node.lower_bound(k)
+            if idx == node.n or node.keys[idx] != k:
+                idx = None
+        if idx is not None:
+            # The entry removed is the pending one, overwritten by its
+            # replacement, or else the leaf's own.
+            owner, owner_idx = (node, idx) if pending is None else pending
+            if removed is not None:
+                removed.append(owner.values[owner_idx:owner_idx + 1].tolist()[0])
+            if pending is not None:
+                owner.keys[owner_idx] = node.keys[idx]
+                if owner.values is not None:
+                    owner.values[owner_idx] = node.values[idx]
+            node.keys[idx:node.n - 1] = node.keys[idx + 1:node.n]
+            if node.values is not None:
+                node.values[idx:node.n - 1] = node.values[idx + 1:node.n]
+            node.n -= 1
+        if first:
+            self._root_settled()
+        self._let_go([node] + ([] if pending is None else [pending[0]]))
+        return idx is not None
+
+    # Hooks for subclasses that guard the nodes a delete works on (pinned
+    # pages, latches): _hold_root and _hold take hold of the root and of the
+    # given children of node before they are read, _root_settled is called
+    # once the root pointer can no longer change, and _let_go drops the nodes
+    # in `held` other than `kept`.
+    def _hold_root(self) -> BTreeNode:
+        return self.root
+
+    def _hold(self, node: BTreeNode, *indices: int) -> list:
+        return []
+
+    def _root_settled(self):
+        pass
+
+    def _let_go(self, held: list, *kept: BTreeNode):
+        pass
 
     def fill_child(self, node: BTreeNode, idx: int):
         t = self.t
@@ -173,15 +693,26 @@ class BTree:
         child = node.children[idx]
         sibling = node.children[idx - 1]
 
-        for i in range(child.n - 1, -1, -1):
-            child.keys[i + 1] = child.keys[i]
+        child.keys[1:child.n + 1] = child.keys[:child.n]
         if not child.leaf:
-            for i in range(child.n, -1, -1):
-                child.children[i + 1] = child.children[i]
+            child.children[1:child.n + 2] = child.children[:child.n + 1]
 
         child.keys[0] = node.keys[idx - 1]
+        if node.values is not None:
+            child.values[1:child.n + 1] = child.values[:child.n]
+            child.values[0] = node.values[idx - 1]
+            node.values[idx - 1] = sibling.values[sibling.n - 1]
         if not sibling.leaf:
-            child.children[0] = sibling.children[sibling.n]
+            # Slices move child references without loading the child itself.
+            child.children[0:1] = sibling.children[sibling.n:sibling.n + 1]
+        if node.counts is not None:
+            moved = 1
+            if child.counts is not None:
+                child.counts[1:child.n + 2] = child.counts[:child.n + 1]
+                child.counts[0] = sibling.counts[sibling.n]
+                moved += child.counts[0]
+            node.counts[idx] += moved
+            node.counts[idx - 1] -= moved
         node.keys[idx - 1] = sibling.keys[sibling.n - 1]
         sibling.n -= 1
         child.n += 1
@@ -191,33 +722,50 @@ class BTree:
         sibling = node.children[idx + 1]
 
         child.keys[child.n] = node.keys[idx]
+        if node.values is not None:
+            child.values[child.n] = node.values[idx]
+            node.values[idx] = sibling.values[0]
+            sibling.values[:sibling.n - 1] = sibling.values[1:sibling.n]
         if not child.leaf:
-            child.children[child.n + 1] = sibling.children[0]
+            child.children[child.n + 1:child.n + 2] = sibling.children[0:1]
+        if node.counts is not None:
+            moved = 1
+            if child.counts is not None:
+                child.counts[child.n + 1] = sibling.counts[0]
+                sibling.counts[:sibling.n] = sibling.counts[1:sibling.n + 1]
+                moved += child.counts[child.n + 1]
+            node.counts[idx] += moved
+            node.counts[idx + 1] -= moved
 
         node.keys[idx] = sibling.keys[0]
-        for i in range(1, sibling.n):
-            sibling.keys[i - 1] = sibling.keys[i]
+        sibling.keys[:sibling.n - 1] = sibling.keys[1:sibling.n]
         if not sibling.leaf:
-            for i in range(1, sibling.n + 1):
-                sibling.children[i - 1] = sibling.children[i]
+            sibling.children[:sibling.n] = sibling.children[1:sibling.n + 1]
         sibling.n -= 1
         child.n += 1
 
     def _merge(self, node: BTreeNode, idx: int):
         child = node.children[idx]
         sibling = node.children[idx + 1]
+        t = self.t
 
-        child.keys[self.t - 1] = node.keys[idx]
-        for i in range(sibling.n):
-            child.keys[i + self.t] = sibling.keys[i]
+        child.keys[t - 1] = node.keys[idx]
+        child.keys[t:t + sibling.n] = sibling.keys[:sibling.n]
+        if node.values is not None:
+            child.values[t - 1] = node.values[idx]
+            child.values[t:t + sibling.n] = sibling.values[:sibling.n]
+            node.values[idx:node.n - 1] = node.values[idx + 1:node.n]
         if not child.leaf:
-            for i in range(sibling.n + 1):
-                child.children[i + self.t] = sibling.children[i]
+            child.children[t:t + sibling.n + 1] = sibling.children[:sibling.n + 1]
+        if child.counts is not None:
+            child.counts[t:t + sibling.n + 1] = sibling.counts[:sibling.n + 1]
 
-        for i in range(idx + 1, node.n):
-            node.keys[i - 1] = node.keys[i]
-        for i in range(idx + 2, node.n + 1):
-            node.children[i - 1] = node.children[i]
+        node.keys[idx:node.n - 1] = node.keys[idx + 1:node.n]
+        node.children[idx + 1:node.n] = node.children[idx + 2:node.n + 1]
+        if node.counts is not None:
+            node.counts[idx] += node.counts[idx + 1] + 1
+            node.counts[idx + 1:node.n] = node.counts[idx + 2:node.n + 1]
 
         child.n += sibling.n + 1
-        node.n -= 1
\ No newline at end of file
+        node.n -= 1
+        self._release_node(sibling)
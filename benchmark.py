@@ -1,112 +1,111 @@
+import csv
+import json
+from itertools import islice
+import multiprocessing
 import os
 import random
+import statistics
 import time
 import memory_profiler
+import numpy as np
 import matplotlib.pyplot as plt
-from avl_tree import AVLTree
-from b_tree import BTree
-import sys
+from memory_accounting import AllocationTracker, structure_bytes
+from structures import BTREE_ORDER, STRUCTURES, make_structure
+from tuning import recommend_order, sweep_orders
 
 DATASET_DIR = "./dataset/"
 PLOTS_DIR = "./plots/"
 RESULTS_FILE = "benchmark_results.md"
+RESULTS_JSON = "benchmark_results.json"
+RESULTS_CSV = "benchmark_results.csv"
+DATASET_SIZES = [1_000, 5_000, 10_000, 50_000, 100_000, 500_000]
+OPERATIONS = ["insert", "search", "delete", "range"]
+SAMPLE_SIZE = 100
+RANGE_LENGTH = 100  # Keys read by each range scan
+MEMORY_BACKEND = "tracemalloc"  # or "rss" for memory_profiler's process RSS deltas
+MB = 1024 * 1024
+DATASET_DTYPE = np.int32
+CHUNK_SIZE = 1 << 20
 
 def ensure_directory_exists(directory):
     if not os.path.exists(directory):
         os.makedirs(directory)
 
+def iter_dataset_chunks(path, chunk_size=CHUNK_SIZE):
+    # Streams a dataset as int32 arrays of at most chunk_size keys (or, for text
+    # files, chunk_size characters), so neither format has to fit in memory.
+    if path.endswith(".npy"):
+        data = np.load(path, mmap_mode="r")
+        for start in range(0, len(data), chunk_size):
+            yield np.array(data[start:start + chunk_size])
+        return
+    with open(path, "r") as f:
+        tail = ""
+        while True:
+            block = f.read(chunk_size)
+            if not block:
+                break
+            tokens = (tail + block).split()
+            # A block ending mid-number leaves its last token for the next one.
+            tail = tokens.pop() if not block[-1].isspace() else ""
+            if tokens:
+                yield np.array(tokens, dtype=DATASET_DTYPE)
+        if tail:
+            yield np.array([tail], dtype=DATASET_DTYPE)
+
+
+def write_dataset(path, size, chunks):
+    temp_path = path + ".tmp"
+    out = np.lib.format.open_memmap(temp_path, mode="w+", dtype=DATASET_DTYPE, shape=(size,))
+    pos = 0
+    for chunk in chunks:
+        out[pos:pos + len(chunk)] = chunk
+        pos += len(chunk)
+    out.flush()
+    del out
+    os.replace(temp_path, path)
+
+
 def generate_or_load_dataset(size):
     ensure_directory_exists(DATASET_DIR)
-    dataset_path = os.path.join(DATASET_DIR, f"dataset_{size}.txt")
-    if os.path.exists(dataset_path):
-        with open(dataset_path, "r") as f:
-            data = list(map(int, f.read().strip().split()))
-        print(f"Loaded dataset of size {size} from {dataset_path}")
-    else:
-        data = [random.randint(0, 10_000_000) for _ in range(size)]
-        with open(dataset_path, "w") as f:
-            f.write(" ".join(map(str, data)))
-        print(f"Generated new dataset of size {size} and saved to {dataset_path}")
+    dataset_path = os.path.join(DATASET_DIR, f"dataset_{size}.npy")
+    text_path = os.path.join(DATASET_DIR, f"dataset_{size}.txt")
+    if not os.path.exists(dataset_path):
+        if os.path.exists(text_path):
+            count = sum(len(chunk) for chunk in iter_dataset_chunks(text_path))
+            write_dataset(dataset_path, count, iter_dataset_chunks(text_path))
+            print(f"Converted {text_path} to {dataset_path}")
+        else:
+            rng = np.random.default_rng()
+            chunks = (rng.integers(0, 10_000_000, min(CHUNK_SIZE, size - start), dtype=DATASET_DTYPE, endpoint=True)
+                      for start in range(0, size, CHUNK_SIZE))
+            write_dataset(dataset_path, size, chunks)
+            print(f"Generated new dataset of size {size} and saved to {dataset_path}")
+    data = np.load(dataset_path, mmap_mode="r")
+    print(f"Loaded dataset of size {size} from {dataset_path}")
     return data
 
 
-def measure_time_and_memory(func, *args, **kwargs):
-    mem_before = memory_profiler.memory_usage()[0]
+def measure_time(func, *args, **kwargs):
     start_time = time.perf_counter()
-
     result = func(*args, **kwargs)
+    return time.perf_counter() - start_time, result
 
-    end_time = time.perf_counter()
-    mem_after = memory_profiler.memory_usage()[0]
-
-    time_elapsed = end_time - start_time
-    mem_diff = mem_after - mem_before
-
-    return time_elapsed, mem_diff, result
-
-
-def run_benchmark_for_size(n):
-    data = generate_or_load_dataset(n)
-
-    avl = AVLTree()
-    btree = BTree(t=3)
-
-    def avl_insert_all():
-        for value in data:
-            avl.insert_key(value)
-
-    avl_insert_time, avl_insert_mem, _ = measure_time_and_memory(avl_insert_all)
-
-    def btree_insert_all():
-        for value in data:
-            btree.insert_key(value)
-
-    btree_insert_time, btree_insert_mem, _ = measure_time_and_memory(btree_insert_all)
-
-    search_samples = random.sample(data, min(n, 100))
-
-    def avl_search_all():
-        for val in search_samples:
-            avl.search_key(val)
-
-    avl_search_time, avl_search_mem, _ = measure_time_and_memory(avl_search_all)
 
-    def btree_search_all():
-        for val in search_samples:
-            btree.search_key(val)
+def measure_memory(func, *args, **kwargs):
+    # Net and peak megabytes allocated by the call: traced by tracemalloc, or
+    # with MEMORY_BACKEND = "rss" read off the process RSS by memory_profiler.
+    if MEMORY_BACKEND == "tracemalloc":
+        with AllocationTracker() as tracker:
+            result = func(*args, **kwargs)
+        return tracker.allocated / MB, tracker.peak / MB, result
+    if MEMORY_BACKEND != "rss":
+        raise ValueError(f"unknown memory backend {MEMORY_BACKEND!r}")
 
-    btree_search_time, btree_search_mem, _ = measure_time_and_memory(btree_search_all)
-
-    delete_samples = random.sample(data, min(n, 100))
-
-    def avl_delete_all():
-        for val in delete_samples:
-            avl.delete_key(val)
-
-    avl_delete_time, avl_delete_mem, _ = measure_time_and_memory(avl_delete_all)
-
-    def btree_delete_all():
-        for val in delete_samples:
-            btree.delete_key(val)
-
-    btree_delete_time, btree_delete_mem, _ = measure_time_and_memory(btree_delete_all)
-
-    return {
-        "size": n,
-        "avl_insert_time": avl_insert_time,
-        "avl_insert_mem": avl_insert_mem,
-        "avl_search_time": avl_search_time,
-        "avl_search_mem": avl_search_mem,
-        "avl_delete_time": avl_delete_time,
-        "avl_delete_mem": avl_delete_mem,
-
-        "btree_insert_time": btree_insert_time,
-        "btree_insert_mem": btree_insert_mem,
-        "btree_search_time": btree_search_time,
-        "btree_search_mem": btree_search_mem,
-        "btree_delete_time": btree_delete_time,
-        "btree_delete_mem": btree_delete_mem,
-    }
+    mem_before = memory_profiler.memory_usage()[0]
+    mem_peak, result = memory_profiler.memory_usage((func, args, kwargs), max_usage=True, retval=True)
+    mem_after = memory_profiler.memory_usage()[0]
+    return mem_after - mem_before, float(np.max(mem_peak)) - mem_before, result
 
 
 def generate_plots(results):
@@ -118,10 +117,13 @@ def generate_plots(results):
     plt.figure()
     plt.plot(sizes, [res["avl_insert_time"] for res in results], label="AVL Insert")
     plt.plot(sizes, [res["btree_insert_time"] for res in results], label="B-Tree Insert")
+    plt.plot(sizes, [res["bplustree_insert_time"] for res in results], label="B+Tree Insert")
     plt.plot(sizes, [res["avl_search_time"] for res in results], label="AVL Search")
     plt.plot(sizes, [res["btree_search_time"] for res in results], label="B-Tree Search")
+    plt.plot(sizes, [res["bplustree_search_time"] for res in results], label="B+Tree Search")
     plt.plot(sizes, [res["avl_delete_time"] for res in results], label="AVL Delete")
     plt.plot(sizes, [res["btree_delete_time"] for res in results], label="B-Tree Delete")
+    plt.plot(sizes, [res["bplustree_delete_time"] for res in results], label="B+Tree Delete")
     plt.xlabel("Dataset Size")
     plt.ylabel("Time (seconds)")
     plt.title("Time Complexity")
@@ -132,10 +134,13 @@ def generate_plots(results):
     plt.figure()
     plt.plot(sizes, [res["avl_insert_mem"] for res in results], label="AVL Insert")
     plt.plot(sizes, [res["btree_insert_mem"] for res in results], label="B-Tree Insert")
+    plt.plot(sizes, [res["bplustree_insert_mem"] for res in results], label="B+Tree Insert")
     plt.plot(sizes, [res["avl_search_mem"] for res in results], label="AVL Search")
     plt.plot(sizes, [res["btree_search_mem"] for res in results], label="B-Tree Search")
+    plt.plot(sizes, [res["bplustree_search_mem"] for res in results], label="B+Tree Search")
     plt.plot(sizes, [res["avl_delete_mem"] for res in results], label="AVL Delete")
     plt.plot(sizes, [res["btree_delete_mem"] for res in results], label="B-Tree Delete")
+    plt.plot(sizes, [res["bplustree_delete_mem"] for res in results], label="B+Tree Delete")
     plt.xlabel("Dataset Size")
     plt.ylabel("Memory (MB)")
     plt.title("Memory Complexity")
@@ -143,7 +148,7 @@ def generate_plots(results):
     plt.savefig(os.path.join(PLOTS_DIR, "memory_complexity.png"))
 
 
-def save_results_to_markdown(results):
+def save_results_to_markdown(results, cells=None, sweep=None, t=None):
     with open(RESULTS_FILE, "w") as f:
         f.write("# Benchmark Results\n\n")
         f.write(
@@ -153,11 +158,15 @@ def save_results_to_markdown(results):
         f.write(
             "| Size | AVL Insert (s) | AVL Insert (MB) | AVL Search (s) | AVL Search (MB) | AVL Delete (s) | AVL Delete (MB) | ")
         f.write(
-            "B-Tree Insert (s) | B-Tree Insert (MB) | B-Tree Search (s) | B-Tree Search (MB) | B-Tree Delete (s) | B-Tree Delete (MB) |\n")
+            "B-Tree Insert (s) | B-Tree Insert (MB) | B-Tree Search (s) | B-Tree Search (MB) | B-Tree Delete (s) | B-Tree Delete (MB) | ")
+        f.write(
+            "B+Tree Insert (s) | B+Tree Insert (MB) | B+Tree Search (s) | B+Tree Search (MB) | B+Tree Delete (s) | B+Tree Delete (MB) |\n")
         f.write(
             "|------|----------------|-----------------|----------------|-----------------|----------------|-----------------|")
         f.write(
-            "------------------|------------------|------------------|------------------|------------------|------------------|\n")
+            "------------------|------------------|------------------|------------------|------------------|------------------|")
+        f.write(
+            "-------------------|--------------------|-------------------|--------------------|-------------------|--------------------|\n")
 
         for res in results:
             f.write(
@@ -167,30 +176,190 @@ def save_results_to_markdown(results):
                 f"{res['avl_delete_time']:.4f} | {res['avl_delete_mem']:.4f} | "
                 f"{res['btree_insert_time']:.4f} | {res['btree_insert_mem']:.4f} | "
                 f"{res['btree_search_time']:.4f} | {res['btree_search_mem']:.4f} | "
-                f"{res['btree_delete_time']:.4f} | {res['btree_delete_mem']:.4f} |\n"
+                f"{res['btree_delete_time']:.4f} | {res['btree_delete_mem']:.4f} | "
+                f"{res['bplustree_insert_time']:.4f} | {res['bplustree_insert_mem']:.4f} | "
+                f"{res['bplustree_search_time']:.4f} | {res['bplustree_search_mem']:.4f} | "
+                f"{res['bplustree_delete_time']:.4f} | {res['bplustree_delete_mem']:.4f} |\n"
             )
 
+        if cells:
+            f.write("\n## Trial Statistics\n")
+            f.write("| Structure | Operation | Size | Trials | Median (s) | Min (s) | Stddev (s) |\n")
+            f.write("|-----------|-----------|------|--------|------------|---------|------------|\n")
+            for cell in cells:
+                f.write(
+                    f"| {cell['structure']} | {cell['operation']} | {cell['size']} | {cell['trials']} | "
+                    f"{cell['median_time']:.4f} | {cell['min_time']:.4f} | {cell['stddev_time']:.4f} |\n"
+                )
+
+            f.write("\n## Memory Footprint\n")
+            f.write("| Structure | Size | Structure (MB) | Bytes/Key | Insert Peak (MB) |\n")
+            f.write("|-----------|------|----------------|-----------|------------------|\n")
+            for cell in cells:
+                if cell["operation"] == "insert":
+                    f.write(
+                        f"| {cell['structure']} | {cell['size']} | {cell['structure_mb']:.4f} | "
+                        f"{cell['bytes_per_key']:.1f} | {cell['peak_mb']:.4f} |\n"
+                    )
+
+        if sweep:
+            f.write("\n## B-Tree Order Sweep\n")
+            f.write(f"Measured on {sweep[0]['sample_size']} keys sampled from the largest dataset; "
+                    f"the benchmark above used t = {t}.\n\n")
+            f.write("| t | Insert (ops/s) | Search (ops/s) | Delete (ops/s) | Bytes/Key |\n")
+            f.write("|---|----------------|----------------|----------------|-----------|\n")
+            for row in sweep:
+                f.write(
+                    f"| {row['t']} | {row['insert_ops']:.0f} | {row['search_ops']:.0f} | "
+                    f"{row['delete_ops']:.0f} | {row['bytes_per_key']:.1f} |\n"
+                )
+
         f.write("\n")
         f.write("## Key Metrics\n")
         f.write("- **Time** is measured in seconds.\n")
-        f.write("- **Memory** is measured in megabytes (MB).\n")
+        if not sweep:
+            f.write(f"- **B-tree order** is fixed at t = {t} for both B-tree variants.\n")
+        f.write(f"- **Range** scans read up to {RANGE_LENGTH} keys in order, starting at each sampled key.\n")
+        if MEMORY_BACKEND == "rss":
+            f.write("- **Memory** is measured in megabytes (MB): growth of the process RSS over the operation, read by memory_profiler.\n")
+        else:
+            f.write("- **Memory** is measured in megabytes (MB): bytes allocated by the operation, traced by tracemalloc.\n")
+        f.write("- **Structure** size sums the tree's node objects, keys and NumPy buffers.\n")
         f.write("\n")
         f.write("## Visualization\n")
         f.write("Refer to the generated plots in the `/plots` folder for a visual comparison of the results.\n")
 
 
-def run_full_benchmark():
-    dataset_sizes = [1_000, 5_000, 10_000, 50_000, 100_000, 500_000]
+def run_cell(cell):
+    # Times one (structure, operation, size) cell: `warmups` untimed runs, then
+    # `trials` timed ones, then a last run under MEMORY_BACKEND for memory, so
+    # the measuring overhead never lands in a timing. Samples come from a
+    # generator seeded by the seed, operation and size only, so every structure
+    # sees the same keys.
+    structure, operation, size, seed, warmups, trials, t = cell
+    data = generate_or_load_dataset(size).tolist()
+    rng = random.Random(f"{seed}-{operation}-{size}")
+    tree = None
+    times = []
+    for trial in range(warmups + trials + 1):
+        samples = rng.sample(data, min(size, SAMPLE_SIZE))
+        if operation == "insert" or tree is None:
+            tree = make_structure(structure, t)
+            if operation != "insert":
+                for value in data:
+                    tree.insert_key(value)
+
+        if operation == "insert":
+            def run():
+                for value in data:
+                    tree.insert_key(value)
+        elif operation == "search":
+            def run():
+                for value in samples:
+                    tree.search_key(value)
+        elif operation == "delete":
+            def run():
+                for value in samples:
+                    tree.delete_key(value)
+        else:
+            def run():
+                for value in samples:
+                    for _ in islice(tree.iter_range(value), RANGE_LENGTH):
+                        pass
+
+        if trial < warmups + trials:
+            elapsed, _ = measure_time(run)
+            if trial >= warmups:
+                times.append(elapsed)
+        else:
+            alloc_mb, peak_mb, _ = measure_memory(run)
+        if operation == "delete":
+            # Put the keys back so the next trial deletes from a full tree.
+            for value in samples:
+                tree.insert_key(value)
+
+    footprint = structure_bytes(tree)
+    return {
+        "structure": structure,
+        "operation": operation,
+        "size": size,
+        "t": t if structure != "avl" else None,
+        "seed": seed,
+        "trials": trials,
+        "median_time": statistics.median(times),
+        "min_time": min(times),
+        "stddev_time": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "alloc_mb": alloc_mb,
+        "peak_mb": peak_mb,
+        "structure_mb": footprint / MB,
+        "bytes_per_key": footprint / size,
+    }
 
-    results = []
-    for size in dataset_sizes:
-        stats = run_benchmark_for_size(size)
-        results.append(stats)
 
-    save_results_to_markdown(results)
-    generate_plots(results)
+def tuned_order(size, seed=0):
+    # Sweeps t on the dataset of `size` keys and caches the sweep next to it,
+    # so later runs reuse it until the dataset is regenerated.
+    data = generate_or_load_dataset(size)
+    dataset_path = os.path.join(DATASET_DIR, f"dataset_{size}.npy")
+    sweep_path = os.path.join(DATASET_DIR, f"order_sweep_{size}_{seed}.json")
+    if os.path.exists(sweep_path) and os.path.getmtime(sweep_path) >= os.path.getmtime(dataset_path):
+        with open(sweep_path, "r") as f:
+            sweep = json.load(f)
+        print(f"Loaded B-tree order sweep from {sweep_path}")
+    else:
+        sweep = sweep_orders(data, seed=seed)
+        with open(sweep_path, "w") as f:
+            json.dump(sweep, f, indent=2)
+    return recommend_order(sweep), sweep
+
+
+def save_cells(cells):
+    with open(RESULTS_JSON, "w") as f:
+        json.dump(cells, f, indent=2)
+    with open(RESULTS_CSV, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(cells[0]))
+        writer.writeheader()
+        writer.writerows(cells)
+
+
+def cells_to_results(cells):
+    # Folds the cells back into one row per size, with "{structure}_{op}_time"
+    # and "_mem" keys for the summary table and plots, using each cell's median.
+    by_size = {}
+    for cell in cells:
+        row = by_size.setdefault(cell["size"], {"size": cell["size"]})
+        key = f"{cell['structure']}_{cell['operation']}"
+        row[f"{key}_time"] = cell["median_time"]
+        row[f"{key}_mem"] = cell["alloc_mb"]
+    return [by_size[size] for size in sorted(by_size)]
+
+
+def run_full_benchmark(seed=0, warmups=1, trials=5, processes=None, dataset_sizes=DATASET_SIZES, t=BTREE_ORDER,
+                       tune=False):
+    # Every cell runs in a fresh worker process, so no heap state or memory
+    # readings carry over between cells, and the pool keeps all cores busy.
+    # Missing datasets are created up front rather than by racing workers.
+    for size in dataset_sizes:
+        generate_or_load_dataset(size)
+    sweep = None
+    if tune:
+        t, sweep = tuned_order(max(dataset_sizes), seed)
+        print(f"Tuned B-tree order: t = {t}")
+    cells = [
+        (structure, operation, size, seed, warmups, trials, t)
+        for size in sorted(dataset_sizes, reverse=True)  # Longest cells first
+        for structure in STRUCTURES
+        for operation in OPERATIONS
+    ]
+    with multiprocessing.Pool(processes, maxtasksperchild=1) as pool:
+        results = pool.map(run_cell, cells, chunksize=1)
+    results.sort(key=lambda cell: (cell["size"], cell["structure"], OPERATIONS.index(cell["operation"])))
+
+    save_cells(results)
+    rows = cells_to_results(results)
+    save_results_to_markdown(rows, results, sweep, t)
+    generate_plots(rows)
 
 
 if __name__ == "__main__":
-    sys.setrecursionlimit(2_000_000)
-    run_full_benchmark()
\ No newline at end of file
+    run_full_benchmark()
@@ -0,0 +1,190 @@
+import threading
+
+import numpy as np
+
+from b_tree import BTree, BTreeNode
+
+
+class RWLatch:
+    # Shared/exclusive latch. Waiting writers block new readers, so a steady
+    # stream of lookups cannot starve an update.
+    __slots__ = ['_cond', '_readers', '_writer', '_waiting_writers']
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    def acquire_read(self):
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+
+class LatchedBTreeNode(BTreeNode):
+    __slots__ = ['latch']
+
+    def __init__(self, t: int, leaf: bool = True, key_dtype=int):
+        super().__init__(t, leaf=leaf, key_dtype=key_dtype)
+        self.latch = RWLatch()
+
+
+class ConcurrentBTree(BTree):
+    # A BTree whose search_key, search_many, insert_key and delete_key may run
+    # from many threads at once. Every node carries a reader/writer latch and
+    # operations crab down: a child is latched before its parent is released.
+    # The root pointer has a latch of its own, held by writers until the root
+    # is known not to split or collapse. Writers split full children and fill
+    # minimal ones on the way down, so a latched child never pushes a change
+    # back up and the parent can be released right away. Other methods (range
+    # iteration, order statistics, batch rebuilds) need external quiescence.
+    def __init__(self, t: int, key_dtype=int):
+        self._root_latch = RWLatch()
+        super().__init__(t, key_dtype=key_dtype)
+
+    @classmethod
+    def from_sorted(cls, keys, t: int, fill: float = 1.0, key_dtype=int):
+        tree = cls(t, key_dtype=key_dtype)
+        tree.bulk_load(keys, fill)
+        return tree
+
+    def _new_node(self, leaf: bool) -> LatchedBTreeNode:
+        return LatchedBTreeNode(self.t, leaf=leaf, key_dtype=self.key_dtype)
+
+    def _latch_root(self, write: bool) -> LatchedBTreeNode:
+        # Returns the root latched in the requested mode, still holding the
+        # root pointer latch.
+        if write:
+            self._root_latch.acquire_write()
+            root = self.root
+            root.latch.acquire_write()
+        else:
+            self._root_latch.acquire_read()
+            root = self.root
+            root.latch.acquire_read()
+        return root
+
+    def search_key(self, k: int) -> bool:
+        node = self._latch_root(write=False)
+        self._root_latch.release_read()
+        while True:
+            i = node.lower_bound(k)
+            if i < node.n and node.keys[i] == k:
+                found = True
+                break
+            if node.leaf:
+                found = False
+                break
+            child = node.children[i]
+            child.latch.acquire_read()
+            node.latch.release_read()
+            node = child
+        node.latch.release_read()
+        return found
+
+    def search_many(self, keys) -> np.ndarray:
+        # Same routing as BTree.search_many; every node on the stack is read
+        # latched and its parent released once all of its children are.
+        keys = np.asarray(keys).ravel()
+        order = np.argsort(keys, kind="stable")
+        probes = keys[order]
+        found = np.zeros(len(probes), dtype=bool)
+        root = self._latch_root(write=False)
+        self._root_latch.release_read()
+        stack = [(root, 0, len(probes))]
+        while stack:
+            node, lo, hi = stack.pop()
+            segment = probes[lo:hi]
+            node_keys = node.keys[:node.n]
+            idx = node_keys.searchsorted(segment, side="left")
+            hit = idx < node.n
+            hit[hit] = node_keys[idx[hit]] == segment[hit]
+            found[lo:hi] |= hit
+            if not node.leaf and len(segment):
+                bounds = np.flatnonzero(idx[1:] != idx[:-1]) + 1
+                starts = [0] + bounds.tolist()
+                ends = bounds.tolist() + [hi - lo]
+                for start, end in zip(starts, ends):
+                    if not hit[start:end].all():
+                        child = node.children[idx[start]]
+                        child.latch.acquire_read()
+                        stack.append((child, lo + start, lo + end))
+            node.latch.release_read()
+        mask = np.empty(len(probes), dtype=bool)
+        mask[order] = found
+        return mask
+
+    def insert_key(self, k: int, value=None):
+        if value is not None:
+            raise TypeError("ConcurrentBTree nodes hold keys only")
+        t = self.t
+        node = self._latch_root(write=True)
+        if node.n == 2 * t - 1:
+            # Nobody can reach the new root before the root latch is released.
+            s = self._new_node(leaf=False)
+            s.latch.acquire_write()
+            s.children[0] = node
+            self.split_child(s, 0)
+            self.root = s
+            node.latch.release_write()
+            node = s
+        self._root_latch.release_write()
+        while not node.leaf:
+            i = node.upper_bound(k)
+            child = node.children[i]
+            child.latch.acquire_write()
+            if child.n == 2 * t - 1:
+                self.split_child(node, i)
+                if k > node.keys[i]:
+                    child.latch.release_write()
+                    child = node.children[i + 1]
+                    child.latch.acquire_write()
+            node.latch.release_write()
+            node = child
+        self.insert_non_full(node, k)
+        node.latch.release_write()
+
+    # BTree._delete_descent does the deleting; these hooks write latch the
+    # nodes it works on. Writers fill a child before entering it, so a latched
+    # child never pushes a change back up and the parent is released as soon
+    # as the descent moves on (unless it awaits a replacement key).
+    def _hold_root(self) -> LatchedBTreeNode:
+        return self._latch_root(write=True)
+
+    def _hold(self, node: LatchedBTreeNode, *indices: int) -> list:
+        held = []
+        for i in indices:
+            if 0 <= i <= node.n:
+                child = node.children[i]
+                child.latch.acquire_write()
+                held.append(child)
+        return held
+
+    def _root_settled(self):
+        self._root_latch.release_write()
+
+    def _let_go(self, held: list, *kept: LatchedBTreeNode):
+        for node in held:
+            if all(node is not other for other in kept):
+                node.latch.release_write()
@@ -0,0 +1,355 @@
+import mmap
+import os
+from contextlib import contextmanager
+
+import numpy as np
+
+from b_tree import BTree, BTreeNode
+from page_cache import PageCache
+
+MAGIC = b"BTREEPG1"
+NO_PAGE = 0xFFFFFFFF
+MIN_CAPACITY = 16
+# An insert pins at most the node, its child and a page split off the child; a
+# delete the node, its child, both siblings and a node awaiting the child's
+# predecessor or successor.
+MIN_CACHE_PAGES = 5
+
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"),
+    ("page_size", "<u4"),
+    ("t", "<u4"),
+    ("key_dtype", "S8"),
+    ("order_statistics", "u1"),
+    ("root", "<u4"),
+    ("page_count", "<u4"),
+    ("free_head", "<u4"),
+])
+
+
+def _align(offset: int, alignment: int) -> int:
+    return -(-offset // alignment) * alignment
+
+
+def page_dtype(t: int, key_dtype, order_statistics: bool, page_size: int) -> np.dtype:
+    # Page layout: n (u4), leaf flag (u1), keys[2t - 1], child page ids[2t] and,
+    # with order statistics, per-child key counts[2t]; padded to page_size.
+    key_dtype = np.dtype(key_dtype)
+    names = ["n", "leaf", "keys", "children"]
+    formats = ["<u4", "u1", (key_dtype, (2 * t - 1,)), ("<u4", (2 * t,))]
+    offsets = [0, 4, 8]
+    offsets.append(_align(8 + (2 * t - 1) * key_dtype.itemsize, 4))
+    end = offsets[-1] + 2 * t * 4
+    if order_statistics:
+        names.append("counts")
+        formats.append(("<i8", (2 * t,)))
+        offsets.append(_align(end, 8))
+        end = offsets[-1] + 2 * t * 8
+    if end > page_size:
+        raise ValueError(f"t={t} does not fit in a {page_size}-byte page")
+    return np.dtype({"names": names, "formats": formats, "offsets": offsets, "itemsize": page_size})
+
+
+def max_order(page_size: int, key_dtype=np.int64, order_statistics: bool = False) -> int:
+    key_size = np.dtype(key_dtype).itemsize
+    per_t = 2 * key_size + 8 + (16 if order_statistics else 0)
+    t = max((page_size - 16) // per_t, 2)
+    while t > 2:
+        try:
+            page_dtype(t, key_dtype, order_statistics, page_size)
+            return t
+        except ValueError:
+            t -= 1
+    page_dtype(t, key_dtype, order_statistics, page_size)
+    return t
+
+
+class PageChildren:
+    # List-like view over a page's child ids that hands out node objects, so
+    # the BTree algorithms can index and slice it like BTreeNode.children.
+    __slots__ = ["tree", "ids"]
+
+    def __init__(self, tree: "DiskBTree", ids: np.ndarray):
+        self.tree = tree
+        self.ids = ids
+
+    def __getitem__(self, index):
+        # Slices stay lazy, so shifting children around moves page ids without
+        # fetching the pages.
+        if isinstance(index, slice):
+            return PageChildren(self.tree, self.ids[index])
+        return self.tree._node(int(self.ids[index]))
+
+    def __setitem__(self, index, value):
+        if isinstance(value, PageChildren):
+            self.ids[index] = value.ids
+        elif isinstance(index, slice):
+            self.ids[index] = [child.page_id for child in value]
+        else:
+            self.ids[index] = value.page_id
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self):
+        for page_id in self.ids.tolist():
+            yield self.tree._node(page_id)
+
+
+class DiskBTreeNode(BTreeNode):
+    # A BTreeNode whose fields are views into one page record, either a row of
+    # the mapped file or a page cache frame.
+    __slots__ = ["page_id", "_n", "_leaf", "_children"]
+
+    def __init__(self, tree: "DiskBTree", page_id: int, record: np.ndarray):
+        self.page_id = page_id
+        self._bind(tree, record)
+
+    def _bind(self, tree: "DiskBTree", record: np.ndarray):
+        self.t = tree.t
+        self._n = record["n"]
+        self._leaf = record["leaf"]
+        self.keys = record["keys"][0]
+        self.counts = None
+        self.values = None  # Pages hold keys only
+        if not self._leaf[0]:
+            self._children = PageChildren(tree, record["children"][0])
+            if tree.order_statistics:
+                self.counts = record["counts"][0]
+        else:
+            self._children = None
+
+    @property
+    def n(self) -> int:
+        return int(self._n[0])
+
+    @n.setter
+    def n(self, value: int):
+        self._n[0] = value
+
+    @property
+    def leaf(self) -> bool:
+        return bool(self._leaf[0])
+
+    @property
+    def children(self):
+        return self._children
+
+
+class DiskBTree(BTree):
+    # A BTree stored as fixed-size pages in a single file. Page 0 is the header;
+    # node page i lives at byte offset (i + 1) * page_size. Pages are either
+    # memory-mapped, leaving residency to the OS, or read through a bounded
+    # PageCache of `cache_pages` frames, at least MIN_CACHE_PAGES. Updates pin
+    # only the pages the current step works on and unpin them as the descent
+    # moves down.
+    def __init__(self, path: str, cache_pages: int = None, cache_policy: str = "lru"):
+        if cache_pages is not None and cache_pages < MIN_CACHE_PAGES:
+            raise ValueError(f"cache_pages must be at least {MIN_CACHE_PAGES}")
+        self.path = path
+        self._header = np.memmap(path, dtype=HEADER_DTYPE, mode="r+", shape=(1,))
+        if self._header["magic"][0] != MAGIC:
+            raise ValueError(f"{path} is not a B-tree page file")
+        self.page_size = int(self._header["page_size"][0])
+        self.t = int(self._header["t"][0])
+        self.key_dtype = np.dtype(self._header["key_dtype"][0].decode())
+        self.order_statistics = bool(self._header["order_statistics"][0])
+        self._page_dtype = page_dtype(self.t, self.key_dtype, self.order_statistics, self.page_size)
+        self._nodes = {}
+        self._pinned = None
+        self._capacity = os.path.getsize(path) // self.page_size - 1
+        self.cache = None
+        self._pages = None
+        if cache_pages is None:
+            self._map_pages()
+        else:
+            self.cache = PageCache(path, self._page_dtype, cache_pages, offset=self.page_size, policy=cache_policy)
+
+    @classmethod
+    def create(cls, path: str, page_size: int = mmap.PAGESIZE, key_dtype=np.int64,
+               order_statistics: bool = False, t: int = None, **cache_options) -> "DiskBTree":
+        if t is None:
+            t = max_order(page_size, key_dtype, order_statistics)
+        page_dtype(t, key_dtype, order_statistics, page_size)
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header["magic"] = MAGIC
+        header["page_size"] = page_size
+        header["t"] = t
+        header["key_dtype"] = np.dtype(key_dtype).str.encode()
+        header["order_statistics"] = order_statistics
+        header["root"] = NO_PAGE
+        header["free_head"] = NO_PAGE
+        with open(path, "wb") as f:
+            f.write(header.tobytes().ljust(page_size, b"\0"))
+            f.truncate(page_size * (1 + MIN_CAPACITY))
+        tree = cls(path, **cache_options)
+        tree.root = tree._new_node(leaf=True)
+        return tree
+
+    @classmethod
+    def open(cls, path: str, cache_pages: int = None, cache_policy: str = "lru") -> "DiskBTree":
+        return cls(path, cache_pages=cache_pages, cache_policy=cache_policy)
+
+    @classmethod
+    def from_sorted(cls, keys, path: str, fill: float = 1.0, **options) -> "DiskBTree":
+        tree = cls.create(path, **options)
+        tree.bulk_load(keys, fill)
+        return tree
+
+    def _map_pages(self):
+        self._pages = np.memmap(self.path, dtype=self._page_dtype, mode="r+",
+                                offset=self.page_size, shape=(self._capacity,))
+        # Views held by live node objects would still point at the old mapping.
+        for page_id, node in self._nodes.items():
+            node._bind(self, self._pages[page_id:page_id + 1])
+
+    @property
+    def root(self) -> DiskBTreeNode:
+        return self._node(int(self._header["root"][0]))
+
+    @root.setter
+    def root(self, node: DiskBTreeNode):
+        self._header["root"] = node.page_id
+
+    def _node(self, page_id: int) -> DiskBTreeNode:
+        if self.cache is None:
+            node = self._nodes.get(page_id)
+            if node is None:
+                node = DiskBTreeNode(self, page_id, self._pages[page_id:page_id + 1])
+                self._nodes[page_id] = node
+            return node
+        frame = self.cache.get(page_id)
+        if self._pinned is not None:
+            # Inside an update every page touched may be written, and node
+            # objects are held across the fetches that split, merge or borrow,
+            # so they stay pinned until _keep lets go of them.
+            if page_id not in self._pinned:
+                self.cache.pin(frame)
+                self._pinned[page_id] = frame
+            frame.dirty = True
+        if frame.node is None:
+            frame.node = DiskBTreeNode(self, page_id, frame.data)
+        return frame.node
+
+    def _record(self, page_id: int) -> np.ndarray:
+        # The page's record for writing outside a node object; forgets any node
+        # bound to it, since the page may change between leaf and internal.
+        if self.cache is None:
+            self._nodes.pop(page_id, None)
+            return self._pages[page_id:page_id + 1]
+        frame = self.cache.get(page_id)
+        frame.dirty = True
+        frame.node = None
+        return frame.data
+
+    @contextmanager
+    def _updating(self):
+        if self.cache is None or self._pinned is not None:
+            yield
+            return
+        self._pinned = {}
+        try:
+            yield
+        finally:
+            self._keep()
+            self._pinned = None
+
+    def _keep(self, *nodes: DiskBTreeNode):
+        # Unpins every page the update has fetched except those of `nodes`.
+        if not self._pinned:
+            return
+        kept = {node.page_id for node in nodes}
+        for page_id in [page_id for page_id in self._pinned if page_id not in kept]:
+            self.cache.unpin(self._pinned.pop(page_id))
+
+    def _allocate_page(self) -> int:
+        header = self._header
+        page_id = int(header["free_head"][0])
+        if page_id != NO_PAGE:
+            header["free_head"] = self._record(page_id)["children"][0][0]
+            return page_id
+        page_id = int(header["page_count"][0])
+        if page_id == self._capacity:
+            self._capacity = max(2 * self._capacity, MIN_CAPACITY)
+            with open(self.path, "r+b") as f:
+                f.truncate(self.page_size * (1 + self._capacity))
+            if self.cache is None:
+                self._map_pages()
+        header["page_count"] = page_id + 1
+        return page_id
+
+    def _new_node(self, leaf: bool) -> DiskBTreeNode:
+        page_id = self._allocate_page()
+        record = self._record(page_id)
+        record["n"] = 0
+        record["leaf"] = leaf
+        if self.order_statistics:
+            record["counts"] = 0
+        return self._node(page_id)
+
+    def _release_node(self, node: DiskBTreeNode):
+        self._record(node.page_id)["children"][0][0] = self._header["free_head"][0]
+        self._header["free_head"] = node.page_id
+
+    def insert_key(self, k: int, value=None):
+        # Iterative form of BTree.insert_key that drops each parent's pin once
+        # the descent has moved past it.
+        if value is not None:
+            raise TypeError("DiskBTree pages hold keys only")
+        t = self.t
+        with self._updating():
+            if self.root.n == 2 * t - 1:
+                self._grow_root()
+            node = self.root
+            self._keep(node)
+            while not node.leaf:
+                i = node.upper_bound(k)
+                if node.children[i].n == 2 * t - 1:
+                    self.split_child(node, i)
+                    if k > node.keys[i]:
+                        i += 1
+                if node.counts is not None:
+                    node.counts[i] += 1
+                child = node.children[i]
+                self._keep(child)
+                node = child
+            self.insert_non_full(node, k)
+
+    def _delete(self, k: int, removed: list = None) -> bool:
+        # BTree._delete_descent pins each page as it is fetched; _let_go keeps
+        # only the child being entered and a node awaiting its replacement key.
+        # The search runs before the update so its path is never pinned.
+        removes = not self.order_statistics or self.search(self.root, k) is not None
+        with self._updating():
+            return self._delete_descent(k, removes, removed)
+
+    def _let_go(self, held: list, *kept: DiskBTreeNode):
+        self._keep(*kept)
+
+    def bulk_load(self, keys, fill: float = 1.0, values=None):
+        # The old pages are discarded wholesale rather than freed one by one.
+        self._header["page_count"] = 0
+        self._header["free_head"] = NO_PAGE
+        self._nodes.clear()
+        super().bulk_load(keys, fill, values)
+
+    def flush(self):
+        if self.cache is None:
+            self._pages.flush()
+        else:
+            self.cache.flush()
+        self._header.flush()
+
+    def close(self):
+        self.flush()
+        self._nodes.clear()
+        if self.cache is not None:
+            self.cache.close()
+        self._pages = None
+        del self._header
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,73 @@
+import bisect
+
+import numpy as np
+
+
+class LatencyHistogram:
+    # Log-spaced buckets between min_value and max_value seconds, so relative
+    # precision is the same for microsecond and second latencies; values
+    # outside the range land in an underflow or overflow bucket.
+    def __init__(self, min_value: float = 1e-7, max_value: float = 10.0, buckets_per_decade: int = 20):
+        decades = np.log10(max_value) - np.log10(min_value)
+        self.bounds = np.logspace(np.log10(min_value), np.log10(max_value),
+                                  int(round(decades * buckets_per_decade)) + 1)
+        self._bounds = self.bounds.tolist()
+        self.counts = np.zeros(len(self.bounds) + 1, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def record(self, value: float):
+        self.counts[bisect.bisect_right(self._bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def record_many(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        if not len(values):
+            return
+        np.add.at(self.counts, self.bounds.searchsorted(values, side="right"), 1)
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def merge(self, other: "LatencyHistogram"):
+        if len(other.counts) != len(self.counts) or not np.array_equal(other.bounds, self.bounds):
+            raise ValueError("histograms have different buckets")
+        self.counts += other.counts
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, q: float) -> float:
+        # Upper bound of the bucket holding the q-th percentile, clamped to the
+        # observed extremes.
+        if not 0 <= q <= 100:
+            raise ValueError("percentile must be between 0 and 100")
+        if not self.count:
+            return 0.0
+        rank = max(1, int(np.ceil(q / 100 * self.count)))
+        bucket = int(np.cumsum(self.counts).searchsorted(rank))
+        upper = self.bounds[bucket] if bucket < len(self.bounds) else self.max
+        return float(min(max(upper, self.min), self.max))
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "min": self.min if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "p999": self.percentile(99.9),
+            "max": self.max,
+        }
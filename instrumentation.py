@@ -0,0 +1,157 @@
+import json
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from avl_tree import AVLTree
+from b_tree import BTree
+from histogram import LatencyHistogram
+
+TIMED_OPERATIONS = ["insert_key", "delete_key", "search_key", "search_many", "insert_many", "delete_many"]
+MUTATING_OPERATIONS = {"insert_key", "delete_key", "insert_many", "delete_many"}
+BTREE_EVENTS = {
+    "split_child": "split",
+    "_merge": "merge",
+    "_borrow_from_prev": "borrow_from_prev",
+    "_borrow_from_next": "borrow_from_next",
+}
+
+
+class TreeStats:
+    # counters: structural events (rotations by type, splits, merges, borrows)
+    # and nodes visited by search_key. visits: how many search_key calls
+    # visited n nodes. latencies: one histogram per public operation.
+    # heights: (operation number, height) sampled every `height_every`
+    # mutating operations.
+    def __init__(self, height_every: int = 1000):
+        self.height_every = height_every
+        self.counters = Counter()
+        self.visits = Counter()
+        self.latencies = {}
+        self.heights = []
+        self.operations = 0
+
+    def histogram(self, name: str) -> LatencyHistogram:
+        if name not in self.latencies:
+            self.latencies[name] = LatencyHistogram()
+        return self.latencies[name]
+
+    def reset(self):
+        self.__init__(self.height_every)
+
+    def dump(self) -> dict:
+        return {
+            "operations": self.operations,
+            "counters": dict(self.counters),
+            "nodes_visited_per_search": {str(k): v for k, v in sorted(self.visits.items())},
+            "latencies": {name: histogram.to_dict() for name, histogram in self.latencies.items() if histogram.count},
+            "heights": self.heights,
+        }
+
+    def dumps(self) -> str:
+        return json.dumps(self.dump(), indent=2)
+
+
+def tree_height(tree) -> int:
+    if isinstance(tree, AVLTree):
+        return tree.get_height(tree.root)
+    height = 1
+    node = tree.root
+    while not node.leaf:
+        node = node.children[0]
+        height += 1
+    return height
+
+
+def _counting(original, counters: Counter, event: str):
+    def wrapper(*args, **kwargs):
+        counters[event] += 1
+        return original(*args, **kwargs)
+    return wrapper
+
+
+def instrument(tree, stats: TreeStats = None) -> TreeStats:
+    # Shadows the tree's methods with counting/timing wrappers stored as
+    # instance attributes. The class is untouched, so trees that are not
+    # instrumented (or after uninstrument) pay nothing. The algorithms call
+    # their helpers through self, so the wrappers see every internal call.
+    if "_instrumented" in vars(tree):
+        raise ValueError("tree is already instrumented")
+    stats = stats or TreeStats()
+    counters = stats.counters
+    wrapped = []
+
+    def install(name, wrapper):
+        setattr(tree, name, wrapper)
+        wrapped.append(name)
+
+    if isinstance(tree, AVLTree):
+        install("left_rotate", _counting(tree.left_rotate, counters, "rotate_left"))
+        install("right_rotate", _counting(tree.right_rotate, counters, "rotate_right"))
+        rebalance = tree.rebalance
+
+        def classify_rebalance(node):
+            # Rotation cases named by the path to the heavy grandchild.
+            balance = tree.get_height(node.left) - tree.get_height(node.right)
+            if balance > 1:
+                counters["rotation_lr" if tree.get_balance(node.left) < 0 else "rotation_ll"] += 1
+            elif balance < -1:
+                counters["rotation_rl" if tree.get_balance(node.right) > 0 else "rotation_rr"] += 1
+            return rebalance(node)
+        install("rebalance", classify_rebalance)
+    elif isinstance(tree, BTree):
+        for name, event in BTREE_EVENTS.items():
+            install(name, _counting(getattr(tree, name), counters, event))
+    else:
+        raise TypeError(f"cannot instrument {type(tree).__name__}")
+
+    for name in TIMED_OPERATIONS:
+        install(name, _timing(tree, stats, name, getattr(tree, name)))
+
+    timed_search_key = tree.search_key
+
+    def search_with_visits(key):
+        # The timed call is the real search_key; the path is walked again
+        # after it, untimed, to count the nodes visited. Only search_key
+        # lookups are counted: search_many, get and the descents inside
+        # updates are not.
+        found = timed_search_key(key)
+        path = tree.search_key_with_path(key)[1]
+        stats.visits[len(path)] += 1
+        counters["search_nodes"] += len(path)
+        return found
+    install("search_key", search_with_visits)
+    tree._instrumented = wrapped
+    return stats
+
+
+def _timing(tree, stats: TreeStats, name: str, original):
+    histogram = stats.histogram(name)
+    mutating = name in MUTATING_OPERATIONS
+    clock = time.perf_counter
+
+    def wrapper(*args, **kwargs):
+        start = clock()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            histogram.record(clock() - start)
+            stats.operations += 1
+            if mutating and stats.operations % stats.height_every == 0:
+                stats.heights.append((stats.operations, tree_height(tree)))
+    return wrapper
+
+
+def uninstrument(tree):
+    for name in vars(tree).pop("_instrumented", []):
+        vars(tree).pop(name, None)
+
+
+@contextmanager
+def capture(tree, height_every: int = 1000):
+    # with capture(tree) as stats: ... records only inside the block.
+    stats = instrument(tree, TreeStats(height_every))
+    try:
+        yield stats
+    finally:
+        uninstrument(tree)
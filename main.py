@@ -1,5 +1,4 @@
 import os
-import sys
 from benchmark import run_full_benchmark
 from visualize import main as run_visualizations
 
@@ -28,8 +27,6 @@ def main():
 
     setup_environment()
 
-    sys.setrecursionlimit(2_000_000)
-
     print("\nRunning benchmarks...")
     run_full_benchmark()
 
@@ -0,0 +1,107 @@
+import sys
+import tracemalloc
+
+import numpy as np
+
+from array_avl_tree import ArrayAVLTree
+from avl_tree import AVLTree
+from b_plus_tree import BPlusTree
+from b_tree import BTree
+
+
+class AllocationTracker:
+    # Context manager reporting the bytes allocated (net) and the peak above
+    # the starting point while its block ran, from tracemalloc. With
+    # snapshots=True it also keeps before/after snapshots for top().
+    def __init__(self, snapshots: bool = False):
+        self.snapshots = snapshots
+        self.allocated = 0
+        self.peak = 0
+        self._before = None
+        self._after = None
+
+    def __enter__(self):
+        self._started = not tracemalloc.is_tracing()
+        if self._started:
+            tracemalloc.start()
+        if self.snapshots:
+            self._before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        self._baseline = tracemalloc.get_traced_memory()[0]
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        current, peak = tracemalloc.get_traced_memory()
+        self.allocated = current - self._baseline
+        self.peak = peak - self._baseline
+        if self.snapshots:
+            self._after = tracemalloc.take_snapshot()
+        if self._started:
+            tracemalloc.stop()
+
+    def top(self, limit: int = 10, key_type: str = "lineno") -> list:
+        if self._after is None:
+            raise ValueError("top() needs a tracker created with snapshots=True")
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        after = self._after.filter_traces(ignore)
+        before = self._before.filter_traces(ignore)
+        return after.compare_to(before, key_type)[:limit]
+
+
+def _object_bytes(obj, seen: set) -> int:
+    if obj is None or id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    # sys.getsizeof of an array that owns its data includes the buffer; views
+    # are charged for their header only, the buffer belongs to their base.
+    return sys.getsizeof(obj)
+
+
+def structure_bytes(tree) -> int:
+    # Bytes held by a tree: the tree object, every node and, for AVLTree, the
+    # key and value objects; for BTree and BPlusTree the arrays and child list
+    # of each node.
+    seen = set()
+    total = _object_bytes(tree, seen) + _object_bytes(getattr(tree, "__dict__", None), seen)
+    if isinstance(tree, ArrayAVLTree):
+        for value in vars(tree).values():
+            if isinstance(value, np.ndarray):
+                total += _object_bytes(value, seen)
+        return total
+    if isinstance(tree, AVLTree):
+        stack = [tree.root] if tree.root else []
+        while stack:
+            node = stack.pop()
+            total += _object_bytes(node, seen) + _object_bytes(node.key, seen)
+            total += _object_bytes(node.value, seen)
+            if node.left:
+                stack.append(node.left)
+            if node.right:
+                stack.append(node.right)
+        return total
+    if isinstance(tree, BTree):
+        stack = [tree.root]
+        while stack:
+            node = stack.pop()
+            total += _object_bytes(node, seen) + _object_bytes(node.keys, seen)
+            total += _object_bytes(node.counts, seen) + _object_bytes(node.values, seen)
+            if not node.leaf:
+                total += _object_bytes(node.children, seen)
+                stack.extend(node.children[:node.n + 1])
+        return total
+    if isinstance(tree, BPlusTree):
+        stack = [tree.root]
+        while stack:
+            node = stack.pop()
+            total += _object_bytes(node, seen) + _object_bytes(node.keys, seen)
+            if node.leaf:
+                total += _object_bytes(node.copies, seen)
+            else:
+                total += _object_bytes(node.children, seen)
+                stack.extend(node.children[:node.n + 1])
+        return total
+    raise TypeError(f"no byte accounting for {type(tree).__name__}")
+
+
+def bytes_per_key(tree, key_count: int) -> float:
+    return structure_bytes(tree) / key_count if key_count else 0.0
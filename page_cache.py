@@ -0,0 +1,138 @@
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+
+class Frame:
+    __slots__ = ['page_id', 'data', 'dirty', 'pins', 'referenced', 'slot', 'node']
+
+    def __init__(self, page_id: int, data: np.ndarray, slot: int):
+        self.page_id = page_id
+        self.data = data  # One-element record array holding the page
+        self.dirty = False
+        self.pins = 0
+        self.referenced = True
+        self.slot = slot
+        self.node = None  # Node object bound to this frame, owned by the tree
+
+
+class PageCache:
+    # A bounded pool of page frames over a file of fixed-size records, with
+    # LRU or CLOCK eviction. Dirty frames are written back when evicted or
+    # flushed, pinned frames are never evicted. Every load reads into a fresh
+    # buffer, so views into an evicted frame stay valid (if stale) for readers.
+    def __init__(self, path: str, page_dtype: np.dtype, capacity: int, offset: int = 0, policy: str = "lru"):
+        if policy not in ("lru", "clock"):
+            raise ValueError(f"unknown eviction policy {policy!r}")
+        if capacity < 1:
+            raise ValueError("cache capacity must be at least one page")
+        self.page_dtype = np.dtype(page_dtype)
+        self.page_size = self.page_dtype.itemsize
+        self.offset = offset
+        self.capacity = capacity
+        self.policy = policy
+        self._fd = os.open(path, os.O_RDWR)
+        self._frames = OrderedDict()
+        self._slots = [None] * capacity if policy == "clock" else None
+        self._hand = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writebacks = 0
+
+    def stats(self) -> dict:
+        accesses = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "writebacks": self.writebacks,
+            "hit_rate": self.hits / accesses if accesses else 0.0,
+            "resident": len(self._frames),
+            "capacity": self.capacity,
+        }
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def __contains__(self, page_id: int) -> bool:
+        return page_id in self._frames
+
+    def get(self, page_id: int) -> Frame:
+        frame = self._frames.get(page_id)
+        if frame is not None:
+            self.hits += 1
+            if self._slots is None:
+                self._frames.move_to_end(page_id)
+            else:
+                frame.referenced = True
+            return frame
+        self.misses += 1
+        slot = self._make_room()
+        data = np.zeros(1, dtype=self.page_dtype)
+        os.preadv(self._fd, [data.view(np.uint8)], self.offset + page_id * self.page_size)
+        frame = Frame(page_id, data, slot)
+        self._frames[page_id] = frame
+        if self._slots is not None:
+            self._slots[slot] = frame
+        return frame
+
+    def pin(self, frame: Frame):
+        frame.pins += 1
+
+    def unpin(self, frame: Frame):
+        frame.pins -= 1
+
+    def flush(self):
+        for frame in self._frames.values():
+            if frame.dirty:
+                self._write(frame)
+        os.fsync(self._fd)
+
+    def close(self):
+        self.flush()
+        self._frames.clear()
+        self._slots = None
+        os.close(self._fd)
+
+    def _write(self, frame: Frame):
+        os.pwrite(self._fd, frame.data.view(np.uint8), self.offset + frame.page_id * self.page_size)
+        frame.dirty = False
+        self.writebacks += 1
+
+    def _make_room(self) -> int:
+        # Returns the slot the next frame goes into, evicting a victim if full.
+        if len(self._frames) < self.capacity:
+            return len(self._frames)
+        victim = self._lru_victim() if self._slots is None else self._clock_victim()
+        if victim is None:
+            raise RuntimeError(f"all {self.capacity} cached pages are pinned")
+        if victim.dirty:
+            self._write(victim)
+        del self._frames[victim.page_id]
+        self.evictions += 1
+        return victim.slot
+
+    def _lru_victim(self) -> Frame:
+        for frame in self._frames.values():
+            if not frame.pins:
+                return frame
+        return None
+
+    def _clock_victim(self) -> Frame:
+        # Two sweeps clear every reference bit, so a third finding nothing
+        # unpinned means there is no victim.
+        for _ in range(2 * self.capacity + 1):
+            frame = self._slots[self._hand]
+            self._hand = (self._hand + 1) % self.capacity
+            if frame.pins:
+                continue
+            if frame.referenced:
+                frame.referenced = False
+                continue
+            return frame
+        return None
@@ -0,0 +1,134 @@
+from itertools import count
+
+from avl_tree import AVLNode, AVLTree
+
+# Versions are drawn from one counter shared by all trees, so a tree forked by
+# snapshot() never takes nodes stamped by another tree for its own.
+_versions = count(1)
+
+
+class PersistentAVLNode(AVLNode):
+    __slots__ = ['version']
+
+    def __init__(self, key: int, value=None):
+        super().__init__(key, value)
+        self.version = 0  # The mutation that created this node; 0 is shared
+
+
+class PersistentAVLTree(AVLTree):
+    # An AVLTree whose nodes are never changed once a mutation finishes. Each
+    # insert or delete copies the nodes on its path (and any node a rotation
+    # moves) and returns a new root, so earlier roots stay valid versions and
+    # snapshot() is O(1). Readers of a snapshot need no locks while writers
+    # keep going.
+    node_class = PersistentAVLNode
+
+    def __init__(self, order_statistics: bool = False):
+        super().__init__(order_statistics=order_statistics)
+        self._version = next(_versions)
+
+    def snapshot(self) -> "PersistentAVLTree":
+        snapshot = PersistentAVLTree(order_statistics=self.order_statistics)
+        snapshot.root = self.root
+        return snapshot
+
+    def _writable(self, node: PersistentAVLNode) -> PersistentAVLNode:
+        # Nodes created by the current mutation are modified in place; any
+        # other node is copied first.
+        if node.version == self._version:
+            return node
+        copy = PersistentAVLNode(node.key, node.value)
+        copy.height = node.height
+        copy.size = node.size
+        copy.left = node.left
+        copy.right = node.right
+        copy.version = self._version
+        return copy
+
+    def right_rotate(self, z: PersistentAVLNode) -> PersistentAVLNode:
+        z = self._writable(z)
+        z.left = self._writable(z.left)
+        return super().right_rotate(z)
+
+    def left_rotate(self, z: PersistentAVLNode) -> PersistentAVLNode:
+        z = self._writable(z)
+        z.right = self._writable(z.right)
+        return super().left_rotate(z)
+
+    def insert(self, node: PersistentAVLNode, key: int, value=None) -> PersistentAVLNode:
+        self._version = next(_versions)
+        leaf = PersistentAVLNode(key, value)
+        leaf.version = self._version
+        if not node:
+            return leaf
+        current = self._writable(node)
+        path = [current]
+        while True:
+            if key < current.key:
+                if not current.left:
+                    current.left = leaf
+                    break
+                current.left = self._writable(current.left)
+                current = current.left
+            else:
+                if not current.right:
+                    current.right = leaf
+                    break
+                current.right = self._writable(current.right)
+                current = current.right
+            path.append(current)
+        return self._retrace(path)
+
+    def delete(self, node: PersistentAVLNode, key: int, removed: list = None) -> PersistentAVLNode:
+        if not self.search(node, key):
+            return node
+        self._version = next(_versions)
+        current = self._writable(node)
+        path = []
+        while current.key != key:
+            path.append(current)
+            if key < current.key:
+                current.left = self._writable(current.left)
+                current = current.left
+            else:
+                current.right = self._writable(current.right)
+                current = current.right
+        if removed is not None:
+            removed.append(current.value)
+        if current.left and current.right:
+            path.append(current)
+            current.right = self._writable(current.right)
+            successor = current.right
+            while successor.left:
+                path.append(successor)
+                successor.left = self._writable(successor.left)
+                successor = successor.left
+            current.key = successor.key
+            current.value = successor.value
+            current = successor
+        replacement = current.left or current.right
+        if not path:
+            return replacement
+        parent = path[-1]
+        if parent.left is current:
+            parent.left = replacement
+        else:
+            parent.right = replacement
+        return self._retrace(path)
+
+    def put(self, key: int, value):
+        # Updating a value in place would show through in snapshots, so the
+        # path down to the key is copied like any other mutation.
+        if not self.search(self.root, key):
+            self.root = self.insert(self.root, key, value)
+            return
+        self._version = next(_versions)
+        self.root = current = self._writable(self.root)
+        while current.key != key:
+            if key < current.key:
+                current.left = self._writable(current.left)
+                current = current.left
+            else:
+                current.right = self._writable(current.right)
+                current = current.right
+        current.value = value
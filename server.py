@@ -0,0 +1,297 @@
+import argparse
+import asyncio
+import itertools
+import json
+import struct
+import time
+from collections import deque
+
+import numpy as np
+
+from avl_tree import AVLTree
+from b_tree import BTree
+
+# Frames are a u32 byte length followed by the body. A request body is op (u8),
+# request id (u64) and int64 keys; a response body is request id (u64), status
+# (u8) and the payload: one byte per key for SEARCH, an i64 count for INSERT and
+# DELETE, UTF-8 JSON for STATS. Clients number requests from 1: id 0 tags the
+# ERROR answer to a body too short to carry an id, which nobody waits for.
+LENGTH = struct.Struct("<I")
+REQUEST = struct.Struct("<BQ")
+RESPONSE = struct.Struct("<QB")
+COUNT = struct.Struct("<q")
+SEARCH, INSERT, DELETE, STATS = 1, 2, 3, 4
+OK, ERROR = 0, 1
+NO_REQUEST = 0
+KEY_DTYPE = np.dtype("<i8")
+
+
+async def read_frame(reader: asyncio.StreamReader) -> bytes:
+    header = await reader.readexactly(LENGTH.size)
+    return await reader.readexactly(LENGTH.unpack(header)[0])
+
+
+def write_frame(writer: asyncio.StreamWriter, body: bytes):
+    writer.write(LENGTH.pack(len(body)) + body)
+
+
+class TreeServer:
+    # Serves one AVLTree or BTree. Lookups arriving within `batch_window`
+    # seconds of each other are answered by a single search_many call (which
+    # sorts the merged batch); a batch is also cut once it holds `max_batch`
+    # keys. Updates first flush the pending lookups, so every request sees
+    # the tree as of its arrival order.
+    def __init__(self, tree, batch_window: float = 0.0005, max_batch: int = 4096, latency_samples: int = 100_000):
+        self.tree = tree
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._pending = []
+        self._pending_keys = 0
+        self._timer = None
+        self.latencies = deque(maxlen=latency_samples)
+        self.requests = 0
+        self.batches = 0
+        self.batched_keys = 0
+
+    async def search(self, keys: np.ndarray) -> np.ndarray:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((keys, future))
+        self._pending_keys += len(keys)
+        if self._pending_keys >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.batch_window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+        self._pending_keys = 0
+        if not pending:
+            return
+        keys = np.concatenate([keys for keys, _ in pending])
+        try:
+            found = self.tree.search_many(keys)
+        except Exception as e:
+            # Every lookup in the batch fails rather than waiting forever.
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.batched_keys += len(keys)
+        start = 0
+        for keys, future in pending:
+            if not future.done():
+                future.set_result(found[start:start + len(keys)])
+            start += len(keys)
+
+    async def _dispatch(self, op: int, keys: np.ndarray) -> bytes:
+        if op == SEARCH:
+            return (await self.search(keys)).astype(np.uint8).tobytes()
+        if op == INSERT:
+            self._flush()
+            return COUNT.pack(self.tree.insert_many(keys))
+        if op == DELETE:
+            self._flush()
+            return COUNT.pack(self.tree.delete_many(keys))
+        if op == STATS:
+            return json.dumps(self.stats()).encode()
+        raise ValueError(f"unknown op {op}")
+
+    async def _answer(self, body: bytes, writer: asyncio.StreamWriter, received: float):
+        request_id = NO_REQUEST
+        try:
+            op, request_id = REQUEST.unpack_from(body)
+            payload = await self._dispatch(op, np.frombuffer(body, dtype=KEY_DTYPE, offset=REQUEST.size))
+            status = OK
+        except Exception as e:
+            payload = str(e).encode()
+            status = ERROR
+        write_frame(writer, RESPONSE.pack(request_id, status) + payload)
+        self.requests += 1
+        self.latencies.append(time.perf_counter() - received)
+        await writer.drain()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # Requests on one connection may be pipelined; each is answered as soon
+        # as its batch completes, tagged with its request id.
+        tasks = set()
+        try:
+            while True:
+                try:
+                    body = await read_frame(reader)
+                except asyncio.IncompleteReadError:
+                    break
+                task = asyncio.create_task(self._answer(body, writer, time.perf_counter()))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    def stats(self) -> dict:
+        latencies = np.array(self.latencies)
+        p50, p99 = np.percentile(latencies, [50, 99]) if len(latencies) else (0.0, 0.0)
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch_keys": self.batched_keys / self.batches if self.batches else 0.0,
+            "p50_ms": float(p50) * 1000,
+            "p99_ms": float(p99) * 1000,
+        }
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765, path: str = None):
+        if path:
+            server = await asyncio.start_unix_server(self.handle, path=path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+class TreeClient:
+    # Pipelining client: any number of requests may be in flight on the one
+    # connection; responses are matched to callers by request id.
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._reader = reader
+        self._writer = writer
+        self._ids = itertools.count(NO_REQUEST + 1)
+        self._waiting = {}
+        self._receiver = asyncio.create_task(self._receive())
+
+    @classmethod
+    async def connect(cls, host: str = "127.0.0.1", port: int = 8765, path: str = None) -> "TreeClient":
+        if path:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def _receive(self):
+        # Frames that answer no waiting request (NO_REQUEST, or a caller that
+        # was cancelled) are skipped. However the loop ends, every request
+        # still waiting fails instead of hanging.
+        try:
+            while True:
+                body = await read_frame(self._reader)
+                if len(body) < RESPONSE.size:
+                    continue
+                request_id, status = RESPONSE.unpack_from(body)
+                future = self._waiting.pop(request_id, None)
+                if future is None or future.done():
+                    continue
+                payload = body[RESPONSE.size:]
+                if status == OK:
+                    future.set_result(payload)
+                else:
+                    future.set_exception(RuntimeError(payload.decode(errors="replace")))
+        except asyncio.IncompleteReadError:
+            pass
+        finally:
+            waiting, self._waiting = self._waiting, {}
+            for future in waiting.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("server closed the connection"))
+
+    async def _request(self, op: int, keys=()) -> bytes:
+        if self._receiver.done():
+            raise ConnectionError("server closed the connection")
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[request_id] = future
+        keys = np.asarray(keys, dtype=KEY_DTYPE).ravel()
+        write_frame(self._writer, REQUEST.pack(op, request_id) + keys.tobytes())
+        await self._writer.drain()
+        return await future
+
+    async def search(self, keys) -> np.ndarray:
+        return np.frombuffer(await self._request(SEARCH, keys), dtype=np.uint8).astype(bool)
+
+    async def insert(self, keys) -> int:
+        return COUNT.unpack(await self._request(INSERT, keys))[0]
+
+    async def delete(self, keys) -> int:
+        return COUNT.unpack(await self._request(DELETE, keys))[0]
+
+    async def stats(self) -> dict:
+        return json.loads(await self._request(STATS))
+
+    async def close(self):
+        self._writer.close()
+        await self._writer.wait_closed()
+        self._receiver.cancel()
+
+
+async def generate_load(client: TreeClient, keys: np.ndarray, requests: int, concurrency: int,
+                        keys_per_request: int = 1, seed: int = 0) -> dict:
+    # Runs `concurrency` workers issuing lookups of random dataset keys and
+    # reports client-side throughput and latency percentiles.
+    rng = np.random.default_rng(seed)
+    latencies = []
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            probes = rng.choice(keys, keys_per_request)
+            start = time.perf_counter()
+            await client.search(probes)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    p50, p99 = np.percentile(latencies, [50, 99])
+    return {
+        "requests": requests,
+        "lookups_per_sec": requests * keys_per_request / elapsed,
+        "p50_ms": float(p50) * 1000,
+        "p99_ms": float(p99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve tree lookups over a socket, or generate load against a server.")
+    parser.add_argument("mode", choices=["serve", "load"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="Unix socket path; overrides host and port")
+    parser.add_argument("--tree", choices=["avl", "btree"], default="btree")
+    parser.add_argument("--t", type=int, default=32, help="B-tree minimum degree")
+    parser.add_argument("--size", type=int, default=100_000, help="dataset size to load")
+    parser.add_argument("--window", type=float, default=0.0005, help="batching window in seconds")
+    parser.add_argument("--max-batch", type=int, default=4096)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--keys-per-request", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from benchmark import generate_or_load_dataset
+    keys = np.asarray(generate_or_load_dataset(args.size), dtype=np.int64)
+
+    if args.mode == "serve":
+        tree = AVLTree.from_sorted(keys.tolist()) if args.tree == "avl" else BTree.from_sorted(keys, t=args.t)
+        server = TreeServer(tree, batch_window=args.window, max_batch=args.max_batch)
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+        return
+
+    async def run_load():
+        client = await TreeClient.connect(args.host, args.port, args.unix)
+        try:
+            report = await generate_load(client, keys, args.requests, args.concurrency,
+                                         args.keys_per_request, args.seed)
+            report["server"] = await client.stats()
+        finally:
+            await client.close()
+        print(json.dumps(report, indent=2))
+
+    asyncio.run(run_load())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+import multiprocessing as mp
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from avl_tree import AVLTree
+from b_tree import BTree
+
+KEY_DTYPE = np.int64
+
+
+def _make_tree(kind: str, t: int):
+    if kind == "btree":
+        return BTree(t=t, key_dtype=KEY_DTYPE)
+    if kind == "avl":
+        return AVLTree()
+    raise ValueError(f"unknown tree kind {kind!r}")
+
+
+def _serve(conn, kind: str, t: int):
+    # Worker loop. Every batch command names a shared memory segment and the
+    # slice of it that belongs to this shard.
+    tree = _make_tree(kind, t)
+    size = 0
+    while True:
+        command, *args = conn.recv()
+        if command == "stop":
+            conn.send(None)
+            return
+        if command == "size":
+            conn.send(size)
+            continue
+        name, start, end, *extra = args
+        shm = SharedMemory(name=name)
+        keys = np.ndarray((end,), dtype=KEY_DTYPE, buffer=shm.buf)[start:]
+        if command == "insert":
+            size += tree.insert_many(keys)
+            reply = None
+        elif command == "delete":
+            reply = tree.delete_many(keys)
+            size -= reply
+        elif command == "search":
+            result_shm = SharedMemory(name=extra[0])
+            found = np.ndarray((end,), dtype=bool, buffer=result_shm.buf)[start:]
+            found[:] = tree.search_many(keys)
+            del found
+            result_shm.close()
+            reply = None
+        elif command == "dump":
+            keys[:] = np.fromiter(tree, dtype=KEY_DTYPE, count=size)
+            reply = None
+        elif command == "load":
+            tree = _make_tree(kind, t)
+            tree.insert_many(keys)
+            size = len(keys)
+            reply = None
+        else:
+            reply = ValueError(f"unknown command {command!r}")
+        del keys
+        shm.close()
+        conn.send(reply)
+
+
+class ShardedIndex:
+    # Range-partitions keys over worker processes that each own a BTree or
+    # AVLTree. Shard i holds the keys in [boundaries[i - 1], boundaries[i]).
+    # Batches are sorted once, written to a shared memory segment and split
+    # with searchsorted, so workers read their slice in place instead of
+    # unpickling keys, and all shards work on a batch in parallel.
+    def __init__(self, num_shards: int = None, kind: str = "btree", t: int = 32,
+                 key_range=(0, 10_000_001), context: str = None):
+        num_shards = num_shards or mp.cpu_count()
+        _make_tree(kind, t)
+        self.kind = kind
+        self.t = t
+        self.boundaries = np.linspace(key_range[0], key_range[1], num_shards + 1)[1:-1].astype(KEY_DTYPE)
+        # Workers must share this process's resource tracker. One started
+        # lazily inside a worker would unlink segments it merely attached to.
+        resource_tracker.ensure_running()
+        ctx = mp.get_context(context)
+        self._conns = []
+        self._workers = []
+        for _ in range(num_shards):
+            parent, child = ctx.Pipe()
+            worker = ctx.Process(target=_serve, args=(child, kind, t), daemon=True)
+            worker.start()
+            child.close()
+            self._conns.append(parent)
+            self._workers.append(worker)
+
+    @property
+    def num_shards(self) -> int:
+        return len(self._conns)
+
+    def _broadcast(self, commands) -> list:
+        # Sends one command per shard (None skips a shard) before collecting
+        # any reply, so the shards run concurrently.
+        for conn, command in zip(self._conns, commands):
+            if command is not None:
+                conn.send(command)
+        replies = []
+        for conn, command in zip(self._conns, commands):
+            reply = conn.recv() if command is not None else None
+            if isinstance(reply, Exception):
+                raise reply
+            replies.append(reply)
+        return replies
+
+    def _share(self, array: np.ndarray) -> SharedMemory:
+        shm = SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[:] = array
+        return shm
+
+    def _release(self, shm: SharedMemory):
+        shm.close()
+        shm.unlink()
+
+    def _route(self, command: str, keys: np.ndarray, *extra) -> list:
+        # `keys` must be sorted; each shard gets the command for its slice.
+        shm = self._share(keys)
+        cuts = [0] + keys.searchsorted(self.boundaries, side="left").tolist() + [len(keys)]
+        try:
+            return self._broadcast([
+                (command, shm.name, cuts[i], cuts[i + 1], *extra) if cuts[i] < cuts[i + 1] else None
+                for i in range(self.num_shards)
+            ])
+        finally:
+            self._release(shm)
+
+    def sizes(self) -> list:
+        return self._broadcast([("size",)] * self.num_shards)
+
+    def __len__(self) -> int:
+        return sum(self.sizes())
+
+    def insert_many(self, keys) -> int:
+        keys = np.sort(np.asarray(keys, dtype=KEY_DTYPE).ravel())
+        self._route("insert", keys)
+        return len(keys)
+
+    def delete_many(self, keys) -> int:
+        keys = np.sort(np.asarray(keys, dtype=KEY_DTYPE).ravel())
+        return sum(removed or 0 for removed in self._route("delete", keys))
+
+    def search_many(self, keys) -> np.ndarray:
+        keys = np.asarray(keys, dtype=KEY_DTYPE).ravel()
+        order = np.argsort(keys, kind="stable")
+        result_shm = self._share(np.zeros(len(keys), dtype=bool))
+        try:
+            self._route("search", keys[order], result_shm.name)
+            mask = np.empty(len(keys), dtype=bool)
+            mask[order] = np.ndarray((len(keys),), dtype=bool, buffer=result_shm.buf)
+        finally:
+            self._release(result_shm)
+        return mask
+
+    def search_key(self, key: int) -> bool:
+        return bool(self.search_many([key])[0])
+
+    def rebalance(self):
+        # Moves shard boundaries to the quantiles of the stored keys, so every
+        # shard ends up with an equal share, and rebuilds each shard from its
+        # new slice. The shards dump into and load from one shared segment.
+        sizes = self.sizes()
+        total = sum(sizes)
+        offsets = np.concatenate([[0], np.cumsum(sizes)]).tolist()
+        shm = SharedMemory(create=True, size=max(total * KEY_DTYPE().itemsize, 1))
+        try:
+            self._broadcast([
+                ("dump", shm.name, offsets[i], offsets[i + 1]) if sizes[i] else None
+                for i in range(self.num_shards)
+            ])
+            # Shards are ordered, so their dumps concatenate to sorted keys.
+            keys = np.ndarray((total,), dtype=KEY_DTYPE, buffer=shm.buf)
+            if total:
+                self.boundaries = keys[np.arange(1, self.num_shards) * total // self.num_shards].copy()
+            cuts = [0] + keys.searchsorted(self.boundaries, side="left").tolist() + [total]
+            del keys
+            self._broadcast([("load", shm.name, cuts[i], cuts[i + 1]) for i in range(self.num_shards)])
+        finally:
+            self._release(shm)
+
+    def close(self):
+        if not self._conns:
+            return
+        self._broadcast([("stop",)] * self.num_shards)
+        for conn, worker in zip(self._conns, self._workers):
+            worker.join()
+            conn.close()
+        self._conns = []
+        self._workers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,19 @@
+import numpy as np
+
+from avl_tree import AVLTree
+from b_plus_tree import BPlusTree
+from b_tree import BTree
+
+STRUCTURES = ["avl", "btree", "bplustree"]
+BTREE_ORDER = 64  # Among the fastest in tuning.py sweeps; run the benchmark with tune=True to re-measure
+
+
+def make_structure(structure, t=BTREE_ORDER):
+    # The trees the benchmark and the workloads run, built the same way.
+    if structure == "avl":
+        return AVLTree()
+    if structure == "btree":
+        return BTree(t=t, key_dtype=np.int32)
+    if structure == "bplustree":
+        return BPlusTree(t=t, key_dtype=np.int32)
+    raise ValueError(f"unknown structure {structure!r}")
@@ -0,0 +1,98 @@
+import os
+import random
+
+import numpy as np
+import pytest
+
+from array_avl_tree import ArrayAVLTree
+from avl_tree import AVLTree
+from b_tree import BTree
+from wal import RECORD, DurableTree
+
+TREES = [AVLTree, lambda: BTree(t=3), ArrayAVLTree]
+
+
+def crash(tree: DurableTree):
+    # Drops the tree without closing or checkpointing it: only what reached a
+    # group commit survives.
+    tree.wal._file.close()
+
+
+def write_mix(tree: DurableTree, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    expected = []
+    for _ in range(500):
+        key = rng.randrange(200)
+        if rng.random() < 0.7:
+            tree.insert_key(key)
+            expected.append(key)
+        elif key in expected:
+            tree.delete_key(key)
+            expected.remove(key)
+    batch = [rng.randrange(200) for _ in range(50)]
+    tree.insert_many(batch)
+    expected += batch
+    return sorted(expected)
+
+
+@pytest.mark.parametrize("make_tree", TREES)
+def test_committed_writes_survive_a_crash(tmp_path, make_tree):
+    tree = DurableTree(make_tree(), str(tmp_path))
+    expected = write_mix(tree)
+    tree.commit()
+    tree.insert_key(1_000)  # Never committed, so lost
+    crash(tree)
+
+    reopened = DurableTree(make_tree(), str(tmp_path))
+    assert list(reopened.iter_range()) == expected
+    reopened.close()
+
+
+@pytest.mark.parametrize("make_tree", TREES)
+def test_recovery_replays_the_log_after_a_checkpoint(tmp_path, make_tree):
+    tree = DurableTree(make_tree(), str(tmp_path), checkpoint_interval=100)
+    expected = write_mix(tree)
+    tree.delete_many(expected[:20])
+    expected = expected[20:]
+    tree.commit()
+    crash(tree)
+
+    reopened = DurableTree(make_tree(), str(tmp_path))
+    assert reopened.checkpoint_lsn > 0
+    assert list(reopened.iter_range()) == expected
+    reopened.close()
+
+
+def test_torn_tail_is_dropped(tmp_path):
+    tree = DurableTree(AVLTree(), str(tmp_path))
+    tree.insert_many([1, 2, 3])
+    tree.close()
+    with open(os.path.join(tmp_path, "wal_0.log"), "ab") as f:
+        f.write(b"\x00" * (RECORD.size // 2))
+
+    reopened = DurableTree(AVLTree(), str(tmp_path))
+    reopened.insert_key(4)
+    reopened.close()
+    with DurableTree(AVLTree(), str(tmp_path)) as final:
+        assert list(final.iter_range()) == [1, 2, 3, 4]
+
+
+def test_merge_is_logged(tmp_path):
+    tree = DurableTree(AVLTree(), str(tmp_path))
+    tree.insert_many([1, 5])
+    tree.merge(AVLTree.from_sorted([2, 3]))
+    tree.commit()
+    crash(tree)
+    with DurableTree(AVLTree(), str(tmp_path)) as reopened:
+        assert list(reopened.iter_range()) == [1, 2, 3, 5]
+
+
+def test_map_mutators_are_rejected(tmp_path):
+    tree = DurableTree(AVLTree(), str(tmp_path))
+    with pytest.raises(TypeError):
+        tree.put(1, "v")
+    with pytest.raises(TypeError):
+        tree.pop(1)
+    with pytest.raises(AttributeError):
+        tree.bulk_load(np.arange(3))
+    tree.close()
@@ -0,0 +1,121 @@
+import argparse
+import random
+import time
+
+import numpy as np
+
+from b_tree import BTree
+from memory_accounting import structure_bytes
+from workloads import WORKLOADS
+
+ORDERS = [2, 3, 4, 6, 8, 12, 16, 24, 32, 48, 64, 96, 128, 256]
+SAMPLE_SIZE = 20_000
+PROBE_SIZE = 2_000
+OPERATIONS = ["insert", "search", "delete"]
+
+
+def workload_mix(workload="uniform_50_50") -> dict:
+    # Share of each operation: either a WORKLOADS name (reads become searches,
+    # writes split evenly between inserts and deletes) or an explicit mapping.
+    if isinstance(workload, dict):
+        mix = {op: float(workload.get(op, 0.0)) for op in OPERATIONS}
+    elif "insert" in WORKLOADS[workload]:
+        mix = {"insert": 1.0, "search": 0.0, "delete": 0.0}
+    else:
+        read = WORKLOADS[workload]["read"]
+        mix = {"insert": (1 - read) / 2, "search": read, "delete": (1 - read) / 2}
+    total = sum(mix.values())
+    if total <= 0:
+        raise ValueError("workload mix has no operations")
+    return {op: share / total for op, share in mix.items()}
+
+
+def measure_order(t: int, keys: list, probes: list, key_dtype=np.int32) -> dict:
+    # One pass of the benchmark's operations at order t: insert every key one
+    # by one, then look up and delete the probes. Throughputs are ops/second.
+    tree = BTree(t=t, key_dtype=key_dtype)
+    clock = time.perf_counter
+    start = clock()
+    for key in keys:
+        tree.insert_key(key)
+    insert_time = clock() - start
+    footprint = structure_bytes(tree)
+    start = clock()
+    for key in probes:
+        tree.search_key(key)
+    search_time = clock() - start
+    start = clock()
+    for key in probes:
+        tree.delete_key(key)
+    delete_time = clock() - start
+    return {
+        "insert": len(keys) / insert_time,
+        "search": len(probes) / search_time,
+        "delete": len(probes) / delete_time,
+        "bytes_per_key": footprint / len(keys),
+    }
+
+
+def sweep_orders(data, orders=ORDERS, sample_size: int = SAMPLE_SIZE, probe_size: int = PROBE_SIZE,
+                 trials: int = 5, seed: int = 0, key_dtype=np.int32) -> list:
+    # Runs every order on the same random sample of the dataset, `trials`
+    # times, and keeps the best throughput of each operation: scheduler and
+    # allocator noise only ever slow a run down.
+    rng = random.Random(seed)
+    data = np.asarray(data)
+    keys = data[rng.sample(range(len(data)), min(sample_size, len(data)))].tolist()
+    probes = rng.sample(keys, min(probe_size, len(keys)))
+    results = []
+    for t in orders:
+        runs = [measure_order(t, keys, probes, key_dtype) for _ in range(trials)]
+        row = {"t": t, "sample_size": len(keys)}
+        for op in OPERATIONS:
+            row[f"{op}_ops"] = max(run[op] for run in runs)
+        row["bytes_per_key"] = runs[-1]["bytes_per_key"]
+        results.append(row)
+    return results
+
+
+def score(row: dict, mix: dict) -> float:
+    # Expected seconds per operation under the mix; lower is better.
+    return sum(share / row[f"{op}_ops"] for op, share in mix.items() if share)
+
+
+def recommend_order(results: list, workload="uniform_50_50", max_bytes_per_key: float = None) -> int:
+    mix = workload_mix(workload)
+    candidates = [row for row in results if max_bytes_per_key is None or row["bytes_per_key"] <= max_bytes_per_key]
+    if not candidates:
+        raise ValueError(f"no order fits in {max_bytes_per_key} bytes per key")
+    return min(candidates, key=lambda row: score(row, mix))["t"]
+
+
+def tuned_btree(data, workload="uniform_50_50", max_bytes_per_key: float = None, key_dtype=np.int32, **options):
+    # Returns an empty BTree with the order the sweep measured best for the
+    # workload, together with the sweep itself.
+    results = sweep_orders(data, key_dtype=key_dtype, **options)
+    t = recommend_order(results, workload, max_bytes_per_key)
+    return BTree(t=t, key_dtype=key_dtype), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep the B-tree order t and recommend the fastest one.")
+    parser.add_argument("--size", type=int, default=100_000, help="dataset to sample keys from")
+    parser.add_argument("--sample", type=int, default=SAMPLE_SIZE)
+    parser.add_argument("--trials", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workload", default="uniform_50_50", choices=list(WORKLOADS))
+    parser.add_argument("--orders", type=int, nargs="*", default=ORDERS)
+    args = parser.parse_args()
+
+    from benchmark import generate_or_load_dataset
+    results = sweep_orders(generate_or_load_dataset(args.size), args.orders, args.sample,
+                           trials=args.trials, seed=args.seed)
+    print(f"{'t':>5} {'insert/s':>12} {'search/s':>12} {'delete/s':>12} {'bytes/key':>10}")
+    for row in results:
+        print(f"{row['t']:>5} {row['insert_ops']:>12.0f} {row['search_ops']:>12.0f} "
+              f"{row['delete_ops']:>12.0f} {row['bytes_per_key']:>10.1f}")
+    print(f"Recommended t for {args.workload}: {recommend_order(results, args.workload)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import os
+import re
+import struct
+import zlib
+
+import numpy as np
+
+# Every record is lsn (u64), op (u8), key (i64) and a CRC32 of those fields.
+RECORD = struct.Struct("<QBqI")
+INSERT = 1
+DELETE = 2
+CHECKPOINT_NAME = re.compile(r"checkpoint_(\d+)\.npy$")
+LOG_NAME = re.compile(r"wal_(\d+)\.log$")
+# Read-only methods DurableTree forwards to the wrapped tree; anything that
+# changes the tree has to go through the log instead.
+READ_METHODS = frozenset([
+    "search", "search_key", "search_many", "search_key_with_path", "iter_range", "count_range",
+    "rank", "select", "quantile", "get", "items", "get_height",
+])
+
+
+def _fsync_directory(directory: str):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def encode_record(lsn: int, op: int, key: int) -> bytes:
+    body = RECORD.pack(lsn, op, key, 0)[:-4]
+    return body + struct.pack("<I", zlib.crc32(body))
+
+
+def read_log(path: str):
+    # Returns the (lsn, op, key) records up to the first torn or corrupt one,
+    # and the byte length of that valid prefix.
+    with open(path, "rb") as f:
+        data = f.read()
+    records = []
+    end = len(data) - len(data) % RECORD.size
+    offset = 0
+    while offset < end:
+        lsn, op, key, crc = RECORD.unpack_from(data, offset)
+        if crc != zlib.crc32(data[offset:offset + RECORD.size - 4]) or op not in (INSERT, DELETE):
+            break
+        records.append((lsn, op, key))
+        offset += RECORD.size
+    return records, offset
+
+
+class WriteAheadLog:
+    # Append-only log with group commit: records are buffered and written with
+    # a single fsync once `group_size` of them are pending or on commit().
+    def __init__(self, path: str, group_size: int = 1024):
+        self.path = path
+        self.group_size = group_size
+        self._file = open(path, "ab")
+        self._pending = []
+
+    def append(self, lsn: int, op: int, key: int):
+        self._pending.append(encode_record(lsn, op, key))
+        if len(self._pending) >= self.group_size:
+            self.commit()
+
+    def commit(self):
+        if not self._pending:
+            return
+        self._file.write(b"".join(self._pending))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending.clear()
+
+    def close(self):
+        self.commit()
+        self._file.close()
+
+
+class DurableTree:
+    # Wraps an AVLTree, BTree or ArrayAVLTree so that insert_key/delete_key are
+    # logged before they are applied. Checkpoints store the keys as a sorted
+    # int64 array in checkpoint_<lsn>.npy and start a new wal_<lsn>.log for the
+    # records after it. Opening a directory loads the newest checkpoint through
+    # insert_many (a bulk build into the empty tree) and replays the log tail.
+    # Operations since the last group commit are lost on a crash.
+    def __init__(self, tree, directory: str, group_size: int = 1024, checkpoint_interval: int = None):
+        self.tree = tree
+        self.directory = directory
+        self.group_size = group_size
+        self.checkpoint_interval = checkpoint_interval
+        os.makedirs(directory, exist_ok=True)
+        self.checkpoint_lsn = 0
+        self.lsn = 0
+        self._recover()
+        self._since_checkpoint = self.lsn - self.checkpoint_lsn
+        self.wal = WriteAheadLog(self._log_path(self.checkpoint_lsn), group_size)
+
+    def _files(self, pattern):
+        found = []
+        for name in os.listdir(self.directory):
+            match = pattern.match(name)
+            if match:
+                found.append((int(match.group(1)), os.path.join(self.directory, name)))
+        return sorted(found)
+
+    def _log_path(self, lsn: int) -> str:
+        return os.path.join(self.directory, f"wal_{lsn}.log")
+
+    def _recover(self):
+        checkpoints = self._files(CHECKPOINT_NAME)
+        if checkpoints:
+            self.checkpoint_lsn, path = checkpoints[-1]
+            self.tree.insert_many(np.load(path))
+        self.lsn = self.checkpoint_lsn
+        logs = self._files(LOG_NAME)
+        for start, path in logs:
+            records, valid = read_log(path)
+            for lsn, op, key in records:
+                if lsn > self.lsn:
+                    self._apply(op, key)
+                    self.lsn = lsn
+            if valid < os.path.getsize(path):
+                # Drop the torn tail so later appends follow the valid records.
+                with open(path, "r+b") as f:
+                    f.truncate(valid)
+
+    def _apply(self, op: int, key: int):
+        if op == INSERT:
+            self.tree.insert_key(key)
+        else:
+            self.tree.delete_key(key)
+
+    def _log(self, op: int, key: int):
+        self.lsn += 1
+        self.wal.append(self.lsn, op, int(key))
+        self._since_checkpoint += 1
+
+    def _maybe_checkpoint(self):
+        if self.checkpoint_interval is not None and self._since_checkpoint >= self.checkpoint_interval:
+            self.checkpoint()
+
+    def insert_key(self, key: int, value=None):
+        if value is not None:
+            raise TypeError("the write-ahead log records keys only")
+        self._log(INSERT, key)
+        self.tree.insert_key(key)
+        self._maybe_checkpoint()
+
+    def delete_key(self, key: int):
+        self._log(DELETE, key)
+        self.tree.delete_key(key)
+        self._maybe_checkpoint()
+
+    def insert_many(self, keys) -> int:
+        keys = np.asarray(keys).ravel()
+        for key in keys.tolist():
+            self._log(INSERT, key)
+        count = self.tree.insert_many(keys)
+        self._maybe_checkpoint()
+        return count
+
+    def delete_many(self, keys) -> int:
+        keys = np.asarray(keys).ravel()
+        for key in keys.tolist():
+            self._log(DELETE, key)
+        removed = self.tree.delete_many(keys)
+        self._maybe_checkpoint()
+        return removed
+
+    def merge(self, other) -> int:
+        # Logs the other tree's keys as inserts, as insert_many does, then lets
+        # the wrapped tree merge them.
+        merge = self.tree.merge
+        keys = np.fromiter(other, dtype=np.int64)
+        for key in keys.tolist():
+            self._log(INSERT, key)
+        merge(other)
+        self._maybe_checkpoint()
+        return len(keys)
+
+    def put(self, key: int, value):
+        raise TypeError("the write-ahead log records keys only")
+
+    def pop(self, key: int, *default):
+        raise TypeError("the write-ahead log records keys only")
+
+    def commit(self):
+        self.wal.commit()
+
+    def checkpoint(self):
+        self.wal.close()
+        self.checkpoint_lsn = self.lsn
+        self._write_checkpoint()
+        self._since_checkpoint = 0
+        self.wal = WriteAheadLog(self._log_path(self.checkpoint_lsn), self.group_size)
+
+    def _write_checkpoint(self):
+        path = os.path.join(self.directory, f"checkpoint_{self.checkpoint_lsn}.npy")
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            np.save(f, np.fromiter(self.tree, dtype=np.int64))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+        _fsync_directory(self.directory)
+        # Everything up to the new checkpoint is now redundant.
+        for lsn, old in self._files(CHECKPOINT_NAME) + self._files(LOG_NAME):
+            if lsn < self.checkpoint_lsn:
+                os.remove(old)
+
+    def close(self):
+        self.wal.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __getattr__(self, name):
+        # Reads go straight to the wrapped tree.
+        if name in READ_METHODS:
+            return getattr(self.tree, name)
+        raise AttributeError(f"{type(self).__name__} does not forward {name!r}")
@@ -0,0 +1,173 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from histogram import LatencyHistogram
+from structures import BTREE_ORDER, STRUCTURES, make_structure
+
+READ, INSERT, DELETE = 0, 1, 2
+OP_NAMES = ["read", "insert", "delete"]
+KEY_MAX = 10_000_000
+DUPLICATE_DOMAIN = 100
+
+# read: share of lookups, the rest are writes split evenly between inserts of
+# new keys and deletes of live ones. keys: how lookups and deletes pick among
+# the live keys. preload: start from the dataset rather than an empty tree.
+WORKLOADS = {
+    "ycsb_a": {"read": 0.5, "keys": "zipf", "preload": True},
+    "ycsb_b": {"read": 0.95, "keys": "zipf", "preload": True},
+    "ycsb_c": {"read": 1.0, "keys": "zipf", "preload": True},
+    "uniform_50_50": {"read": 0.5, "keys": "uniform", "preload": True},
+    "hotspot": {"read": 0.9, "keys": "hotspot", "preload": True},
+    "sequential_insert": {"insert": "sequential", "preload": False},
+    "reverse_insert": {"insert": "reverse", "preload": False},
+    "duplicate_insert": {"insert": "duplicates", "preload": False},
+}
+
+
+class KeyChooser:
+    # Picks ranks in [0, population). Zipf favours low ranks with exponent s;
+    # hotspot sends hot_ops of the picks to the first hot_fraction of ranks.
+    def __init__(self, kind: str, rng: np.random.Generator, population: int,
+                 s: float = 0.99, hot_fraction: float = 0.2, hot_ops: float = 0.8):
+        if kind not in ("uniform", "zipf", "hotspot"):
+            raise ValueError(f"unknown key distribution {kind!r}")
+        self.kind = kind
+        self.rng = rng
+        self.hot_fraction = hot_fraction
+        self.hot_ops = hot_ops
+        if kind == "zipf":
+            weights = 1.0 / np.arange(1, max(population, 1) + 1) ** s
+            self._cdf = np.cumsum(weights) / weights.sum()
+
+    def choose(self, population: int) -> int:
+        if self.kind == "uniform":
+            return int(self.rng.integers(population))
+        if self.kind == "zipf":
+            # The CDF covers the starting population; later inserts extend the
+            # tail, which a Zipfian puts little weight on anyway.
+            rank = int(self._cdf.searchsorted(self.rng.random()))
+            return min(rank, population - 1)
+        hot = max(1, int(population * self.hot_fraction))
+        if self.rng.random() < self.hot_ops or hot == population:
+            return int(self.rng.integers(hot))
+        return int(self.rng.integers(hot, population))
+
+
+def generate_workload(name: str, preload, n_ops: int, seed: int = 0):
+    # Returns (ops, keys) arrays for `n_ops` operations. Mixed workloads track
+    # the live key set, so deletes and most lookups hit keys that exist.
+    spec = WORKLOADS[name]
+    rng = np.random.default_rng(seed)
+    if "insert" in spec:
+        ops = np.full(n_ops, INSERT, dtype=np.uint8)
+        if spec["insert"] == "sequential":
+            keys = np.arange(n_ops, dtype=np.int64)
+        elif spec["insert"] == "reverse":
+            keys = np.arange(n_ops, 0, -1, dtype=np.int64)
+        else:
+            keys = rng.integers(0, DUPLICATE_DOMAIN, n_ops, dtype=np.int64)
+        return ops, keys
+
+    # Popularity ranks are a random permutation of the live keys.
+    live = rng.permutation(np.asarray(preload, dtype=np.int64)).tolist()
+    chooser = KeyChooser(spec["keys"], rng, len(live))
+    draws = rng.random(n_ops)
+    ops = np.empty(n_ops, dtype=np.uint8)
+    keys = np.empty(n_ops, dtype=np.int64)
+    write = 0
+    for i in range(n_ops):
+        if draws[i] < spec["read"] or not live:
+            ops[i] = READ
+            keys[i] = live[chooser.choose(len(live))] if live else 0
+        elif write % 2 == 0:
+            ops[i] = INSERT
+            keys[i] = int(rng.integers(0, KEY_MAX + 1))
+            live.append(int(keys[i]))
+            write += 1
+        else:
+            ops[i] = DELETE
+            j = chooser.choose(len(live))
+            keys[i] = live[j]
+            live[j] = live[-1]
+            live.pop()
+            write += 1
+    return ops, keys
+
+
+def run_workload(tree, ops, keys) -> dict:
+    handlers = [tree.search_key, tree.insert_key, tree.delete_key]
+    latencies = [[], [], []]
+    clock = time.perf_counter
+    start = clock()
+    for op, key in zip(ops.tolist(), keys.tolist()):
+        op_start = clock()
+        handlers[op](key)
+        latencies[op].append(clock() - op_start)
+    elapsed = clock() - start
+
+    report = {"ops": len(ops), "seconds": elapsed, "ops_per_sec": len(ops) / elapsed if elapsed else 0.0}
+    for op, name in enumerate(OP_NAMES):
+        if latencies[op]:
+            histogram = LatencyHistogram()
+            histogram.record_many(latencies[op])
+            report[name] = histogram.to_dict()
+            report[name]["ops_per_sec"] = histogram.count / histogram.total if histogram.total else 0.0
+    return report
+
+
+def run_suite(preload, n_ops: int, seed: int = 0, structures=STRUCTURES, workloads=None,
+              t: int = BTREE_ORDER) -> list:
+    # Every structure runs the same generated operation stream per workload,
+    # built by make_structure as in the benchmark.
+    preload = np.asarray(preload, dtype=np.int64)
+    results = []
+    for name in workloads or WORKLOADS:
+        ops, keys = generate_workload(name, preload, n_ops, seed)
+        for structure in structures:
+            tree = make_structure(structure, t)
+            if WORKLOADS[name]["preload"]:
+                tree.insert_many(preload)
+            report = run_workload(tree, ops, keys)
+            report.update(workload=name, structure=structure, seed=seed)
+            results.append(report)
+    return results
+
+
+def save_suite(results: list, path: str = "workload_results"):
+    with open(f"{path}.json", "w") as f:
+        json.dump(results, f, indent=2)
+    with open(f"{path}.md", "w") as f:
+        f.write("# Workload Results\n\n")
+        f.write("| Workload | Structure | Ops/s | Read p50 (us) | Read p99 (us) | Insert p50 (us) | Insert p99 (us) | "
+                "Delete p50 (us) | Delete p99 (us) |\n")
+        f.write("|----------|-----------|-------|---------------|---------------|-----------------|-----------------|"
+                "-----------------|-----------------|\n")
+        for res in results:
+            cells = []
+            for name in OP_NAMES:
+                stats = res.get(name)
+                cells += [f"{stats['p50'] * 1e6:.2f}", f"{stats['p99'] * 1e6:.2f}"] if stats else ["-", "-"]
+            f.write(f"| {res['workload']} | {res['structure']} | {res['ops_per_sec']:.0f} | " + " | ".join(cells) + " |\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run mixed, skewed and sorted workloads against the trees.")
+    parser.add_argument("--size", type=int, default=100_000, help="dataset size to preload")
+    parser.add_argument("--ops", type=int, default=100_000, help="operations per workload")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--t", type=int, default=BTREE_ORDER, help="B-tree minimum degree")
+    parser.add_argument("--workloads", nargs="*", choices=list(WORKLOADS))
+    args = parser.parse_args()
+
+    from benchmark import generate_or_load_dataset
+    results = run_suite(generate_or_load_dataset(args.size), args.ops, args.seed, workloads=args.workloads, t=args.t)
+    save_suite(results)
+    for res in results:
+        print(f"{res['workload']:>18} {res['structure']:>6} {res['ops_per_sec']:>12.0f} ops/s")
+
+
+if __name__ == "__main__":
+    main()